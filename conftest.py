@@ -0,0 +1,39 @@
+# conftest.py
+import pytest
+from storefront.celery import celery
+
+
+# tasks run in-process, no broker needed
+@pytest.fixture(autouse=True)
+def celery_eager():
+    celery.conf.task_always_eager = True
+    celery.conf.task_eager_propagates = True
+    yield
+    celery.conf.task_always_eager = False
+    celery.conf.task_eager_propagates = False
+
+
+# options for store/tests/test_budgets.py
+def pytest_addoption(parser):
+    group = parser.getgroup('budgets')
+    group.addoption(
+        '--budget-report', default=None,
+        help='Write query counts & timings per endpoint to this JSON file')
+    group.addoption(
+        '--budget-scale', type=int, default=1,
+        help='Multiply the size of the seeded dataset')
+    group.addoption(
+        '--update-budgets', action='store_true',
+        help='Rewrite store/tests/budgets.json from this run')
+
+
+# a 'replica' alias that's a second connection to the test database,
+# tests opt into it with databases=['default', 'replica']
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    from django.conf import settings
+    default = settings.DATABASES['default']
+    settings.DATABASES.setdefault('replica', {
+        **default,
+        'TEST': {**default.get('TEST', {}), 'MIRROR': 'default'}
+    })
@@ -8,3 +8,5 @@ class CoreConfig(AppConfig):
     def ready(self):
         # is called when app(store) is initialized
         import core.signals.handlers
+        from .middleware import install_serializer_timing
+        install_serializer_timing()
@@ -0,0 +1,164 @@
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Serves MEDIA_ROOT at MEDIA_URL, MEDIA_SERVING['MODE'] decides who
+# sends the bytes:
+#   'x-accel-redirect': nginx, from an internal location, e.g.
+#       location /protected-media/ { internal; alias /app/media/; }
+#   'x-sendfile': Apache (mod_xsendfile) or lighttpd, given the path
+#   'python': this process. FileResponse hands the open file to the WSGI
+#       server's wsgi.file_wrapper, gunicorn & uWSGI os.sendfile() it
+#       (zero-copy, from the file's position up to Content-Length, so
+#       ranges too); other servers get it read in blocks.
+# The proxy modes leave ranges to the proxy. Either way Django does the
+# path checks and the conditional & cache headers.
+HASHED_NAME = re.compile(r'[0-9a-f]{64}\.\w+$')  # store/storage.py
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+BLOCK_SIZE = 64 * 1024
+ONE_YEAR = 60 * 60 * 24 * 365
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class RangeFile:
+    # `length` bytes of `file` from its current position, fileno()
+    # lets a file_wrapper sendfile() it
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def get_config():
+    return {
+        'MODE': 'python',
+        'ACCEL_PREFIX': '/protected-media/',
+        'MAX_AGE': 60 * 60,
+        **getattr(settings, 'MEDIA_SERVING', {})
+    }
+
+
+def parse_range(header, size):
+    # (start, end) of a single byte range, None to send the whole file:
+    # no range, one we don't understand, or several (allowed by RFC 9110)
+    match = RANGE.fullmatch(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start >= size:
+            raise RangeNotSatisfiable
+    else:
+        # bytes=-500 is the last 500 bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        start, end = max(size - int(last), 0), size - 1
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, last_modified):
+    # a range is only valid for the version the client already has part of
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+
+    config = get_config()
+    hashed = HASHED_NAME.search(path)
+    # a content-hashed name is its own version
+    etag = f'"{hashed.group().split(".")[0]}"' if hashed \
+        else f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = send_file(request, path, full_path, stat.st_size, config,
+                             if_range_matches(request, etag, last_modified))
+
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if hashed:
+            # the URL changes when the content does
+            patch_cache_control(response, public=True, max_age=ONE_YEAR, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=config['MAX_AGE'])
+    return response
+
+
+def send_file(request, path, full_path, size, config, use_range):
+    if config['MODE'] in ('x-accel-redirect', 'x-sendfile'):
+        # the proxy keeps these headers and sends the body
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = HttpResponse(content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        if config['MODE'] == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = config['ACCEL_PREFIX'] + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+
+    try:
+        byte_range = parse_range(request.headers.get('Range', ''), size) \
+            if use_range else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeFile(file, end - start + 1), status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return response
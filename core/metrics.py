@@ -0,0 +1,85 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+# In-process histograms, rendered in the Prometheus text format by
+# core.views.metrics. Every worker process keeps its own numbers,
+# Prometheus scrapes (and sums) them per instance.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, labels, value):
+        # labels is a tuple of (name, value) pairs
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'counts': [0] * (len(self.buckets) + 1), 'sum': 0, 'count': 0
+                }
+            series['counts'][bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def collect(self):
+        with self._lock:
+            return {
+                labels: {**series, 'counts': list(series['counts'])}
+                for labels, series in self._series.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} histogram'
+        ]
+        for labels, series in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series['counts']):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {series["sum"]}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {series["count"]}')
+        return '\n'.join(lines)
+
+
+def format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+request_duration = Histogram(
+    'storefront_request_duration_seconds', 'Total time spent on the request', DURATION_BUCKETS)
+request_db = Histogram(
+    'storefront_request_db_seconds', 'Time spent running SQL', DURATION_BUCKETS)
+request_serialize = Histogram(
+    'storefront_request_serialize_seconds', 'Time spent in DRF serializers', DURATION_BUCKETS)
+request_render = Histogram(
+    'storefront_request_render_seconds', 'Time spent rendering the response', DURATION_BUCKETS)
+request_queries = Histogram(
+    'storefront_request_queries', 'SQL queries run by the request', QUERY_BUCKETS)
+
+HISTOGRAMS = [request_duration, request_db, request_serialize, request_render, request_queries]
+
+
+def render():
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+def clear():
+    for histogram in HISTOGRAMS:
+        histogram.clear()
@@ -0,0 +1,117 @@
+from contextlib import ExitStack
+from contextvars import ContextVar
+from random import random
+from time import perf_counter
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+from . import metrics
+
+
+# timings of the sampled request being handled, None outside the sample
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0
+        self.serialize = 0
+        self.in_serializer = False
+        self.view_end = None
+        self.db_at_view_end = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # django.db execute_wrapper, runs around every query
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - start
+            self.queries += 1
+
+
+def timed_serializer_data(data):
+    # Serializers do their work when the view reads .data (every DRF
+    # serializer's .data goes through BaseSerializer.data), before the
+    # response is rendered. Installed by CoreConfig.ready().
+    def timed(serializer):
+        timings = _current.get()
+        if timings is None or timings.in_serializer:
+            return data.fget(serializer)
+        # nested serializers are counted with the outer one
+        timings.in_serializer = True
+        start, db = perf_counter(), timings.db
+        try:
+            return data.fget(serializer)
+        finally:
+            timings.in_serializer = False
+            # minus the SQL it triggered (lazy relations)
+            timings.serialize += (perf_counter() - start) - (timings.db - db)
+    timed.__wrapped__ = data
+    return property(timed)
+
+
+def install_serializer_timing():
+    if not hasattr(BaseSerializer.data.fget, '__wrapped__'):
+        BaseSerializer.data = timed_serializer_data(BaseSerializer.data)
+
+
+class RequestMetricsMiddleware:
+    # Measures a sample of requests: query count, SQL time, serializer
+    # time, response rendering time and total time. They're sent back in
+    # a Server-Timing header and added to the histograms served at /metrics/.
+    # Requests outside the sample only pay for a random() call.
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_METRICS.get('SAMPLE_RATE', 0.1)
+
+    def __call__(self, request):
+        if random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        request._timings = timings
+        token = _current.set(timings)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = perf_counter() - start
+
+        # DRF & template responses are rendered after the view returns
+        # (minus any SQL it triggers)
+        render = 0
+        if timings.view_end is not None:
+            render = (start + total - timings.view_end) \
+                - (timings.db - timings.db_at_view_end)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+            f'serialize;dur={timings.serialize * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}'
+        ])
+
+        match = request.resolver_match
+        labels = (
+            ('view', match.view_name if match else 'unresolved'),
+            ('method', request.method)
+        )
+        metrics.request_duration.observe(labels, total)
+        metrics.request_db.observe(labels, timings.db)
+        metrics.request_serialize.observe(labels, timings.serialize)
+        metrics.request_render.observe(labels, render)
+        metrics.request_queries.observe(labels, timings.queries)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, '_timings', None)
+        if timings is not None:
+            timings.view_end = perf_counter()
+            timings.db_at_view_end = timings.db
+        return response
@@ -1,9 +1,11 @@
 from django.dispatch import receiver
+from store import outbox
 from store.signals import order_created
 from store.models import Order
 
 
 @receiver(order_created)
+@outbox.idempotent
 def on_order_created(sender, **kwargs):
     # Order.objects.create(user=kwargs['instance'])
     print(f'Order created: {kwargs['order']}')
@@ -0,0 +1,171 @@
+import os
+import socket
+import pytest
+from django.core.handlers.wsgi import WSGIHandler
+from django.test.client import RequestFactory
+from rest_framework import status
+
+
+DIGEST = 'ab' * 32
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    settings.MEDIA_SERVING = {'MODE': 'python', 'ACCEL_PREFIX': '/protected-media/', 'MAX_AGE': 60}
+    (tmp_path / 'store/images/ab').mkdir(parents=True)
+    (tmp_path / f'store/images/ab/{DIGEST}.jpg').write_bytes(CONTENT)
+    (tmp_path / 'store/images/legacy.jpg').write_bytes(CONTENT)
+    (tmp_path.parent / 'secret.txt').write_text('secret')
+
+
+HASHED_URL = f'/media/store/images/ab/{DIGEST}.jpg'
+
+
+def body(response):
+    return b''.join(response.streaming_content)
+
+
+class TestPythonMediaServing:
+    def test_if_file_exists_returns_it_with_cache_headers(self, client):
+        response = client.get(HASHED_URL)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert body(response) == CONTENT
+        assert response['Content-Type'] == 'image/jpeg'
+        assert response['Content-Length'] == str(len(CONTENT))
+        assert response['Accept-Ranges'] == 'bytes'
+        assert response['ETag'] == f'"{DIGEST}"'
+        assert 'immutable' in response['Cache-Control']
+        assert 'max-age=31536000' in response['Cache-Control']
+
+
+    def test_if_name_is_not_a_hash_returns_short_max_age(self, client):
+        response = client.get('/media/store/images/legacy.jpg')
+
+        assert response['Cache-Control'] == 'public, max-age=60'
+
+
+    def test_if_etag_matches_returns_304(self, client):
+        response = client.get(HASHED_URL, HTTP_IF_NONE_MATCH=f'"{DIGEST}"')
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert 'immutable' in response['Cache-Control']
+
+
+    @pytest.mark.parametrize('header, start, end', [
+        ('bytes=0-99', 0, 99),
+        ('bytes=10000-', 10000, 10239),
+        ('bytes=-40', 10200, 10239),
+        ('bytes=10200-99999', 10200, 10239),
+    ])
+    def test_if_range_is_requested_returns_206(self, client, header, start, end):
+        response = client.get(HASHED_URL, HTTP_RANGE=header)
+
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert body(response) == CONTENT[start:end + 1]
+        assert response['Content-Length'] == str(end - start + 1)
+        assert response['Content-Range'] == f'bytes {start}-{end}/{len(CONTENT)}'
+
+
+    def test_if_range_is_past_the_end_returns_416(self, client):
+        response = client.get(HASHED_URL, HTTP_RANGE='bytes=20000-')
+
+        assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        assert response['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+
+    @pytest.mark.parametrize('header', ['bytes=0-9,20-29', 'bytes=50-10', 'items=0-9'])
+    def test_if_range_is_not_supported_returns_whole_file(self, client, header):
+        response = client.get(HASHED_URL, HTTP_RANGE=header)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert body(response) == CONTENT
+
+
+    def test_if_if_range_is_stale_returns_whole_file(self, client):
+        response = client.get(HASHED_URL, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert body(response) == CONTENT
+
+
+    @pytest.mark.parametrize('url', [
+        '/media/store/images/missing.jpg',
+        '/media/store/images/',
+        '/media/../secret.txt',
+        '/media/%2e%2e/secret.txt',
+    ])
+    def test_if_path_is_not_a_media_file_returns_404(self, client, url):
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+class TestProxyMediaServing:
+    def test_if_mode_is_x_accel_redirect_nginx_sends_file(self, settings, client):
+        settings.MEDIA_SERVING = {**settings.MEDIA_SERVING, 'MODE': 'x-accel-redirect'}
+
+        response = client.get(HASHED_URL, HTTP_RANGE='bytes=0-9')
+
+        # nginx does the range from the internal location
+        assert response.status_code == status.HTTP_200_OK
+        assert response.content == b''
+        assert response['X-Accel-Redirect'] == f'/protected-media/store/images/ab/{DIGEST}.jpg'
+        assert response['Content-Type'] == 'image/jpeg'
+        assert 'immutable' in response['Cache-Control']
+
+
+    def test_if_mode_is_x_sendfile_server_gets_path(self, settings, client):
+        settings.MEDIA_SERVING = {**settings.MEDIA_SERVING, 'MODE': 'x-sendfile'}
+
+        response = client.get(HASHED_URL)
+
+        assert response['X-Sendfile'] == os.path.join(settings.MEDIA_ROOT, f'store/images/ab/{DIGEST}.jpg')
+        assert response.content == b''
+
+
+class SendfileWrapper:
+    # what gunicorn's wsgi.file_wrapper does: os.sendfile() from the
+    # file's current position, at most Content-Length bytes
+    def __init__(self, sock, headers):
+        self.sock = sock
+        self.headers = headers
+
+    def __call__(self, filelike, block_size):
+        fileno = filelike.fileno()
+        offset = os.lseek(fileno, 0, os.SEEK_CUR)
+        count = int(dict(self.headers)['Content-Length'])
+        while count:
+            sent = os.sendfile(self.sock.fileno(), fileno, offset, count)
+            offset += sent
+            count -= sent
+        filelike.close()
+        return []
+
+
+# WSGIHandler sends request_started/finished, which close old
+# database connections, so it needs database access
+@pytest.mark.django_db
+class TestSendfile:
+    @pytest.mark.parametrize('range_header, expected', [
+        (None, CONTENT),
+        ('bytes=100-4195', CONTENT[100:4196]),
+    ], ids=['whole', 'range'])
+    def test_if_server_has_file_wrapper_file_is_sent_with_sendfile(self, range_header, expected):
+        server, client = socket.socketpair()
+        headers = []
+        extra = {'HTTP_RANGE': range_header} if range_header else {}
+        environ = RequestFactory().get(HASHED_URL, **extra).environ
+        environ['wsgi.file_wrapper'] = SendfileWrapper(server, headers)
+
+        result = WSGIHandler()(environ, lambda status, response_headers: headers.extend(response_headers))
+        server.close()
+        received = b''
+        while data := client.recv(65536):
+            received += data
+        client.close()
+
+        assert list(result) == []
+        assert received == expected
@@ -0,0 +1,85 @@
+import pytest
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO
+from uuid import uuid4
+from django.utils.translation import gettext_lazy
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+from store.models import Product
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from model_bakery import baker
+
+
+class TestORJSONRenderer:
+    def test_if_data_has_special_types_returns_same_as_json_renderer(self):
+        data = {
+            'price': Decimal('12.50'),
+            'id': uuid4(),
+            'utc': datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+            'micro': datetime(2024, 5, 1, 12, 30, 0, 123456, tzinfo=timezone.utc),
+            'offset': datetime(2024, 5, 1, 12, 30, tzinfo=timezone(timedelta(hours=5))),
+            'naive': datetime(2024, 5, 1, 12, 30),
+            'date': date(2024, 5, 1),
+            'time': time(8, 15),
+            'duration': timedelta(minutes=3),
+            'lazy': gettext_lazy('hello'),
+            'text': 'ünïcode \u2028 line separator',
+            'items': [{'quantity': 2, 'total': Decimal('0.1')}, None, True],
+            1: 'int key',
+        }
+
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+    def test_if_indent_is_requested_returns_same_as_json_renderer(self):
+        data = {'a': [1, 2], 'b': Decimal('1.5')}
+        media_type = 'application/json; indent=2'
+
+        rendered = ORJSONRenderer().render(data, media_type)
+
+        assert rendered == JSONRenderer().render(data, media_type)
+        assert b'\n' in rendered
+
+
+    def test_if_data_is_none_returns_empty_body(self):
+        assert ORJSONRenderer().render(None) == b''
+
+
+class TestORJSONParser:
+    def test_if_body_is_valid_returns_data(self):
+        data = ORJSONParser().parse(BytesIO('{"quantity": 2, "name": "ü"}'.encode()))
+
+        assert data == {'quantity': 2, 'name': 'ü'}
+
+
+    def test_if_body_is_invalid_raises_parse_error(self):
+        with pytest.raises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"quantity": '))
+
+
+@pytest.mark.django_db
+class TestJSONApi:
+    def test_if_invalid_json_is_posted_returns_400(self):
+        product = baker.make(Product)
+
+        response = APIClient().post(
+            f'/store/products/{product.id}/reviews/', b'{"name": ',
+            content_type='application/json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+    def test_if_json_is_posted_returns_201(self):
+        product = baker.make(Product)
+
+        response = APIClient().post(
+            f'/store/products/{product.id}/reviews/',
+            {'name': 'a', 'description': 'b'}, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response['Content-Type'] == 'application/json'
+        assert response.json()['name'] == 'a'
@@ -0,0 +1,106 @@
+import pytest
+import time
+from core import metrics
+from store.models import Collection
+from store.serializers import CollectionSerializer
+from rest_framework import status
+from rest_framework.test import APIClient
+from model_bakery import baker
+
+
+@pytest.fixture
+def sample_rate(settings):
+    metrics.clear()
+    settings.REQUEST_METRICS = {**settings.REQUEST_METRICS, 'TOKEN': 'secret'}
+    def do_set(rate):
+        settings.REQUEST_METRICS = {**settings.REQUEST_METRICS, 'SAMPLE_RATE': rate}
+    return do_set
+
+
+@pytest.mark.django_db
+class TestRequestMetrics:
+    def test_if_request_is_sampled_returns_server_timing(self, sample_rate):
+        sample_rate(1)
+        baker.make(Collection, _quantity=2)
+
+        response = APIClient().get('/store/collections/')
+
+        assert response.status_code == status.HTTP_200_OK
+        db, serialize, render, total = response['Server-Timing'].split(', ')
+        assert db.startswith('db;dur=') and db.endswith('desc="1 queries"')
+        assert serialize.startswith('serialize;dur=')
+        assert render.startswith('render;dur=')
+        assert total.startswith('total;dur=')
+
+
+    def test_if_request_is_not_sampled_nothing_is_recorded(self, sample_rate):
+        sample_rate(0)
+
+        response = APIClient().get('/store/collections/')
+
+        assert 'Server-Timing' not in response
+        assert 'collection-list' not in metrics.render()
+
+
+    def test_if_metrics_are_read_returns_prometheus_histograms(self, sample_rate):
+        sample_rate(1)
+        client = APIClient()
+        client.get('/store/collections/')
+        client.get('/store/collections/')
+
+        response = client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+
+        assert response['Content-Type'].startswith('text/plain')
+        body = response.content.decode()
+        assert '# TYPE storefront_request_duration_seconds histogram' in body
+        assert 'storefront_request_queries_count{view="collection-list",method="GET"} 2' in body
+        assert 'storefront_request_queries_bucket{view="collection-list",method="GET",le="1"} 2' in body
+        assert 'storefront_request_serialize_seconds_count{view="collection-list",method="GET"} 2' in body
+        assert 'storefront_request_render_seconds_count{view="collection-list",method="GET"} 2' in body
+
+
+    def test_if_serializer_is_slow_it_counts_as_serialize_not_render(self, sample_rate, monkeypatch):
+        sample_rate(1)
+        baker.make(Collection)
+        to_representation = CollectionSerializer.to_representation
+        def slow(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+        monkeypatch.setattr(CollectionSerializer, 'to_representation', slow)
+
+        response = APIClient().get('/store/collections/')
+
+        durations = {
+            part.split(';')[0]: float(part.split('dur=')[1].split(';')[0])
+            for part in response['Server-Timing'].split(', ')
+        }
+        assert durations['serialize'] >= 50
+        assert durations['render'] < 50
+
+
+    def test_if_metrics_are_read_from_outside_returns_404(self, sample_rate):
+        response = APIClient().get(
+            '/metrics/', REMOTE_ADDR='10.0.0.1', HTTP_AUTHORIZATION='Bearer secret')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_metrics_are_read_through_local_proxy_without_token_returns_404(self, sample_rate):
+        response = APIClient().get('/metrics/', REMOTE_ADDR='127.0.0.1')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_metrics_are_read_with_wrong_token_returns_404(self, sample_rate):
+        response = APIClient().get('/metrics/', HTTP_AUTHORIZATION='Bearer guess')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_staff_user_reads_metrics_returns_200(self, sample_rate, django_user_model):
+        client = APIClient()
+        client.force_login(baker.make(django_user_model, is_staff=True))
+
+        response = client.get('/metrics/')
+
+        assert response.status_code == status.HTTP_200_OK
@@ -1,3 +1,26 @@
-from django.shortcuts import render
+from hmac import compare_digest
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from . import metrics as request_metrics
 
-# Create your views here.
+
+def can_read_metrics(request):
+    config = settings.REQUEST_METRICS
+    allowed_ips = config.get('ALLOWED_IPS')
+    if allowed_ips and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return False
+    if request.user.is_staff:
+        return True
+    token = config.get('TOKEN')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' \
+        and compare_digest(credentials.encode(), token.encode())
+
+
+def metrics(request):
+    # internal only, everybody else gets a 404
+    if not can_read_metrics(request):
+        raise Http404
+    return HttpResponse(
+        request_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -17,25 +17,56 @@ const setProgress = (percentCompleted) => {
   progressBar.setAttribute('aria-valuenow', percentCompleted);
 };
 
-const uploadFile = (file) => {
-  const apiUrl = 'http://127.0.0.1:8000/store/products/1/images/';
-
-  const formData = new FormData();
-  // "image" is the key that our endpoint expects.
-  // Look at ProductImageSerializer for details.
-  formData.append('image', file);
-
-  // To send binary data (content of a file) we need
-  // to set the Content-Type of the request header to
-  // multipart/form-data.
-  return axios.post(apiUrl, formData, {
-    headers: { 'Content-Type': 'multipart/form-data' },
-    onUploadProgress: (progressEvent) => {
-      const { loaded, total } = progressEvent;
-      const percentCompleted = Math.round((loaded / total) * 100);
-      setProgress(percentCompleted);
-    },
+const apiUrl = 'http://127.0.0.1:8000/store/products/1/images/';
+
+const sha256 = async (file) => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
+const sendChunks = async (file, upload) => {
+  const uploadUrl = `${apiUrl}uploads/${upload.id}/`;
+  let offset = upload.offset;
+  let retries = 0;
+
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + upload.chunk_size);
+    try {
+      // the raw bytes, no multipart encoding
+      const response = await axios.put(uploadUrl, chunk, {
+        headers: {
+          'Content-Type': 'application/octet-stream',
+          'Upload-Offset': offset,
+        },
+      });
+      offset = response.data.offset;
+      retries = 0;
+    } catch (err) {
+      // a chunk failed (flaky connection), ask the server how much
+      // it has and resume from there
+      if (err.response && err.response.status !== 409) throw err;
+      if (++retries > 5) throw err;
+      const response = await axios.get(uploadUrl);
+      offset = response.data.offset;
+    }
+    setProgress(Math.round((offset / file.size) * 100));
+  }
+
+  return axios.post(`${uploadUrl}finalize/`);
+};
+
+const uploadFile = async (file) => {
+  // Large files are sent in chunks the server writes to disk as they
+  // come, the checksum lets it verify the file before creating the
+  // image. See store/uploads.py for the protocol.
+  const response = await axios.post(`${apiUrl}uploads/`, {
+    filename: file.name,
+    size: file.size,
+    checksum: await sha256(file),
   });
+  return sendChunks(file, response.data);
 };
 
 const handleImageSelect = (event) => {
@@ -55,7 +86,11 @@ const handleSubmit = async (event) => {
     const response = await uploadFile(image.files[0]);
     alert('Image successfully uploaded!', 'success');
   } catch (err) {
-    if (err.response) alert(err.response.data.image[0], 'danger');
+    if (err.response) {
+      const { data } = err.response;
+      const message = data.image || data.size || [data.error];
+      alert(message[0], 'danger');
+    }
     else if (err.request) alert('Could not reach the server!', 'danger');
     else alert('An unexpected error occurred!', 'danger');
   }
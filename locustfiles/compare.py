@@ -0,0 +1,68 @@
+import argparse
+import json
+import sys
+
+
+# Gates a build on a locust report (see report.py) against a baseline
+# taken with the same locustfiles/headless.conf:
+#   python locustfiles/compare.py baseline.json locust-report.json
+# Exits 1 when an endpoint's p95 or p99 grew by more than --max-slowdown
+# (ignoring differences under --min-ms), or its failure ratio went over
+# --max-failure-ratio. Percentiles of endpoints with fewer than
+# --min-requests in either run are too noisy to compare, endpoints
+# missing from the baseline are reported but can't regress.
+
+
+def failure_ratio(stats):
+    return stats['failures'] / stats['requests'] if stats['requests'] else 0
+
+
+def compare(baseline, current, max_slowdown, min_ms, max_failure_ratio, min_requests):
+    regressions = []
+    for name, stats in sorted(current['endpoints'].items()):
+        if failure_ratio(stats) > max_failure_ratio:
+            regressions.append(
+                f'{name}: {failure_ratio(stats):.1%} of requests failed')
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            print(f'new endpoint, not compared: {name}')
+            continue
+        if min(before['requests'], stats['requests']) < min_requests:
+            continue
+        for percentile in ('p95', 'p99'):
+            old, new = before[percentile] or 0, stats[percentile] or 0
+            if new - old > min_ms and new > old * (1 + max_slowdown):
+                regressions.append(f'{name}: {percentile} {old} -> {new} ms')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compares two locust reports")
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--max-slowdown', type=float, default=0.2,
+                        help='allowed p95/p99 growth, 0.2 is 20%%')
+    parser.add_argument('--min-ms', type=float, default=5,
+                        help='smaller differences are noise')
+    parser.add_argument('--max-failure-ratio', type=float, default=0.01)
+    parser.add_argument('--min-requests', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    regressions = compare(
+        baseline, current, args.max_slowdown, args.min_ms,
+        args.max_failure_ratio, args.min_requests)
+    print(f'{baseline["build"] or args.baseline} -> {current["build"] or args.current}')
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if not regressions:
+        print('no regressions')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
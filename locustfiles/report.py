@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import datetime, timezone
+from locust import events
+from locust.runners import WorkerRunner
+
+
+# Imported by the locustfiles, adds:
+#   --report-file   where to write p50/p95/p99 per endpoint when the run stops
+#   --build         label stored in the report, to tell runs apart
+#   --max-product-id  highest product id the scenarios pick from
+#   --staff-username / --staff-password  an is_staff account for
+#                   locustfiles/staff.py, default $LOCUST_STAFF_USERNAME
+#                   & $LOCUST_STAFF_PASSWORD
+
+
+@events.init_command_line_parser.add_listener
+def add_arguments(parser):
+    parser.add_argument(
+        '--report-file', type=str, default='',
+        help='Write per endpoint latency percentiles to this JSON file')
+    parser.add_argument(
+        '--build', type=str, default='',
+        help='Label for the build under test, copied into the report')
+    parser.add_argument(
+        '--max-product-id', type=int, default=1000,
+        help='Products are picked from 1..max-product-id')
+    parser.add_argument(
+        '--staff-username', type=str, default=os.getenv('LOCUST_STAFF_USERNAME', ''),
+        help='Staff account the admin scenario logs in with')
+    parser.add_argument(
+        '--staff-password', type=str, default=os.getenv('LOCUST_STAFF_PASSWORD', ''),
+        help='Password of --staff-username', is_secret=True)
+
+
+def summarize(entry):
+    return {
+        'requests': entry.num_requests,
+        'failures': entry.num_failures,
+        'rps': round(entry.total_rps, 2),
+        'avg': round(entry.avg_response_time, 1),
+        'p50': entry.get_response_time_percentile(0.5),
+        'p95': entry.get_response_time_percentile(0.95),
+        'p99': entry.get_response_time_percentile(0.99),
+        'max': round(entry.max_response_time, 1),
+    }
+
+
+@events.test_stop.add_listener
+def write_report(environment, **kwargs):
+    options = environment.parsed_options
+    # workers only hold partial stats, the master writes the report
+    if not options or not options.report_file or isinstance(environment.runner, WorkerRunner):
+        return
+
+    stats = environment.stats
+    report = {
+        'build': options.build,
+        'host': environment.host,
+        'users': options.num_users,
+        'finished_at': datetime.now(timezone.utc).isoformat(),
+        'endpoints': {
+            f'{entry.method} {entry.name}': summarize(entry)
+            for entry in sorted(stats.entries.values(), key=lambda e: (e.name, e.method))
+        },
+        'total': summarize(stats.total),
+    }
+    with open(options.report_file, 'w') as file:
+        json.dump(report, file, indent=2)
@@ -0,0 +1,97 @@
+from random import choice, randint
+from uuid import uuid4
+from locust import HttpUser, task, between
+import report  # noqa: F401, registers --report-file & co
+
+
+# Mixed workload: most visitors browse, some sign in and buy.
+# Headless run with a report, see locustfiles/headless.conf:
+#   locust --config locustfiles/headless.conf --build $(git rev-parse --short HEAD)
+
+
+def random_product_id(user):
+    return randint(1, user.environment.parsed_options.max_product_id)
+
+
+class ShopperUser(HttpUser):
+    # anonymous: product pages, their reviews & images
+    weight = 3
+    wait_time = between(1, 5)
+
+    @task(4)
+    def view_product(self):
+        self.client.get(
+            f'/store/products/{random_product_id(self)}/',
+            name='/store/products/:id')
+
+    @task(3)
+    def view_reviews(self):
+        self.client.get(
+            f'/store/products/{random_product_id(self)}/reviews/',
+            name='/store/products/:id/reviews')
+
+    @task(2)
+    def view_images(self):
+        self.client.get(
+            f'/store/products/{random_product_id(self)}/images/',
+            name='/store/products/:id/images')
+
+    @task(1)
+    def write_review(self):
+        self.client.post(
+            f'/store/products/{random_product_id(self)}/reviews/',
+            name='/store/products/:id/reviews',
+            json={'name': 'Load test', 'description': 'Great product'})
+
+
+class CustomerUser(HttpUser):
+    # signs up once, logs in with JWT, checks out and looks at orders
+    weight = 1
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        username = f'locust-{uuid4().hex[:12]}'
+        self.credentials = {
+            'username': username,
+            'password': f'Pw-{uuid4().hex}'
+        }
+        self.client.post(
+            '/auth/users/', name='/auth/users',
+            json={**self.credentials, 'email': f'{username}@example.com'})
+        self.login()
+
+    def login(self):
+        response = self.client.post(
+            '/auth/jwt/create', name='/auth/jwt/create', json=self.credentials)
+        token = response.json().get('access') if response.ok else None
+        self.client.headers['Authorization'] = f'JWT {token}'
+
+    @task(1)
+    def relogin(self):
+        self.login()
+
+    @task(3)
+    def view_me(self):
+        self.client.get('/store/customers/me/', name='/store/customers/me')
+
+    @task(4)
+    def checkout(self):
+        cart_id = self.client.post('/store/carts/', name='/store/carts').json()['id']
+        for _ in range(randint(1, 3)):
+            self.client.post(
+                f'/store/carts/{cart_id}/items/', name='/store/carts/:id/items',
+                json={'product_id': random_product_id(self), 'quantity': randint(1, 2)})
+
+        with self.client.post(
+                '/store/orders/', name='/store/orders [checkout]',
+                json={'cart_id': cart_id}, catch_response=True) as response:
+            # sold out is a valid answer under load, not an error
+            if response.status_code == 400 and 'items' in response.json():
+                response.success()
+
+    @task(2)
+    def view_orders(self):
+        response = self.client.get('/store/orders/', name='/store/orders')
+        if response.ok and response.json()['results']:
+            order = choice(response.json()['results'])
+            self.client.get(f'/store/orders/{order["id"]}/', name='/store/orders/:id')
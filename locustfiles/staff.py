@@ -0,0 +1,69 @@
+import logging
+from random import choice, randint
+from uuid import uuid4
+from locust import HttpUser, events, task, between
+import report  # noqa: F401, registers --staff-username & co
+
+
+# Back office: one staff user moving orders along and editing the
+# catalog, next to the shoppers of browse_products.py & shop.py.
+# Needs an is_staff account, see --staff-username in report.py.
+
+
+class StaffUser(HttpUser):
+    fixed_count = 1
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        options = self.environment.parsed_options
+        response = self.client.post(
+            '/auth/jwt/create', name='/auth/jwt/create [staff]',
+            json={'username': options.staff_username, 'password': options.staff_password})
+        response.raise_for_status()
+        self.client.headers['Authorization'] = f'JWT {response.json()["access"]}'
+        self.collection_ids = [
+            collection['id']
+            for collection in self.client.get(
+                '/store/collections/', name='/store/collections').json()
+        ]
+
+    @task(3)
+    def update_order(self):
+        response = self.client.get('/store/orders/', name='/store/orders [staff]')
+        if response.ok and response.json()['results']:
+            order = choice(response.json()['results'])
+            self.client.patch(
+                f'/store/orders/{order["id"]}/', name='/store/orders/:id [staff]',
+                json={'payment_status': choice(['P', 'C', 'F'])})
+
+    @task(2)
+    def update_price(self):
+        product_id = randint(1, self.environment.parsed_options.max_product_id)
+        self.client.patch(
+            f'/store/products/{product_id}/', name='/store/products/:id [staff]',
+            json={'price': f'{randint(100, 99_999) / 100:.2f}'})
+
+    @task(1)
+    def add_and_remove_product(self):
+        if not self.collection_ids:
+            return
+        slug = f'locust-{uuid4().hex[:12]}'
+        response = self.client.post(
+            '/store/products/', name='/store/products [staff]',
+            json={
+                'title': slug, 'slug': slug, 'inventory': 10, 'price': '9.99',
+                'collection': choice(self.collection_ids)
+            })
+        if response.ok:
+            self.client.delete(
+                f'/store/products/{response.json()["id"]}/',
+                name='/store/products/:id [staff]')
+
+
+@events.init.add_listener
+def skip_without_credentials(environment, **kwargs):
+    # nothing to log in with, the other scenarios still run
+    options = environment.parsed_options
+    if options and not options.staff_username and StaffUser in environment.user_classes:
+        logging.warning('No --staff-username, the staff scenario is skipped')
+        environment.user_classes.remove(StaffUser)
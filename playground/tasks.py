@@ -1,10 +1,87 @@
-from time import sleep
+import logging
+from time import perf_counter
+from uuid import uuid4
 from celery import shared_task
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from store.models import Customer
+
+
+logger = logging.getLogger(__name__)
+
+# Held from the fan-out until the last chunk is sent, so a run
+# that's still going makes the next scheduled one a no-op.
+# Workers have to share the cache for this (redis, memcached..).
+LOCK_KEY = 'playground:notify_customers:lock'
+PENDING_KEY = 'playground:notify_customers:pending'
+LOCK_TIMEOUT = 60 * 60  # a crashed run doesn't block forever
+
+
+@shared_task
+def notify_customers(message, subject='News from the store', chunk_size=500):
+    run_id = str(uuid4())
+    if not cache.add(LOCK_KEY, run_id, LOCK_TIMEOUT):
+        logger.info('notify_customers is already running, skipped')
+        return {'skipped': True}
+
+    # the fan-out itself counts as pending, otherwise fast chunks
+    # could drop the count to 0 before every chunk is queued
+    cache.set(PENDING_KEY, 1, LOCK_TIMEOUT)
+    chunks = 0
+    try:
+        customer_ids = Customer.objects \
+            .order_by('id') \
+            .values_list('id', flat=True) \
+            .iterator(chunk_size=chunk_size)
+        chunk = []
+        for customer_id in customer_ids:
+            chunk.append(customer_id)
+            if len(chunk) == chunk_size:
+                queue_chunk(message, subject, chunk)
+                chunks += 1
+                chunk = []
+        if chunk:
+            queue_chunk(message, subject, chunk)
+            chunks += 1
+    finally:
+        release_chunk()
+    return {'skipped': False, 'chunks': chunks}
+
+
+def queue_chunk(message, subject, customer_ids):
+    cache.incr(PENDING_KEY)
+    send_customer_notifications.delay(message, subject, customer_ids)
+
+
+def release_chunk():
+    try:
+        pending = cache.decr(PENDING_KEY)
+    except ValueError:
+        # the lock expired under us, nothing left to release
+        return
+    if pending <= 0:
+        cache.delete_many([PENDING_KEY, LOCK_KEY])
 
 
 @shared_task
-def notify_customers(message):
-    print('Sending 10k emails...')
-    print(message)
-    sleep(10)
-    print('Emails were successfully sent...')
+def send_customer_notifications(message, subject, customer_ids):
+    start = perf_counter()
+    try:
+        emails = Customer.objects \
+            .filter(pk__in=customer_ids) \
+            .exclude(user__email='') \
+            .values_list('user__email', flat=True)
+        # one connection (one SMTP login) for the whole chunk
+        with get_connection() as connection:
+            sent = connection.send_messages([
+                EmailMessage(subject, message, to=[email])
+                for email in emails
+            ]) or 0
+    finally:
+        release_chunk()
+
+    seconds = perf_counter() - start
+    logger.info(
+        'Sent %d notifications in %.2fs (%.1f emails/s)',
+        sent, seconds, sent / seconds if seconds else 0)
+    return {'sent': sent, 'seconds': seconds}
@@ -0,0 +1,64 @@
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from playground import tasks
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def clear_lock():
+    cache.delete_many([tasks.LOCK_KEY, tasks.PENDING_KEY])
+
+
+@pytest.mark.django_db
+class TestNotifyCustomers:
+    def test_if_customers_are_notified_each_gets_one_email(self, mailoutbox):
+        users = [
+            baker.make(settings.AUTH_USER_MODEL, email=f'customer{i}@example.com')
+            for i in range(5)
+        ]
+
+        result = tasks.notify_customers('Hello', chunk_size=2)
+
+        assert result == {'skipped': False, 'chunks': 3}
+        assert sorted(m.to[0] for m in mailoutbox) == sorted(u.email for u in users)
+        assert mailoutbox[0].body == 'Hello'
+
+
+    def test_if_chunk_is_sent_it_opens_one_connection(self, monkeypatch):
+        customers = [
+            baker.make(settings.AUTH_USER_MODEL, email=f'customer{i}@example.com').customer
+            for i in range(3)
+        ]
+        connections = []
+        get_connection = tasks.get_connection
+        def counting_get_connection(*args, **kwargs):
+            connections.append(get_connection(*args, **kwargs))
+            return connections[-1]
+        monkeypatch.setattr(tasks, 'get_connection', counting_get_connection)
+
+        result = tasks.send_customer_notifications(
+            'Hello', 'News', [c.id for c in customers])
+
+        assert result['sent'] == 3
+        assert len(connections) == 1
+
+
+    def test_if_previous_run_is_still_going_run_is_skipped(self, mailoutbox):
+        baker.make(settings.AUTH_USER_MODEL, email='customer@example.com')
+        cache.add(tasks.LOCK_KEY, 'another run')
+
+        result = tasks.notify_customers('Hello')
+
+        assert result == {'skipped': True}
+        assert mailoutbox == []
+
+
+    def test_if_run_is_over_lock_is_released(self, mailoutbox):
+        baker.make(settings.AUTH_USER_MODEL, email='customer@example.com')
+
+        tasks.notify_customers('Hello')
+        tasks.notify_customers('Hello again')
+
+        assert [m.body for m in mailoutbox] == ['Hello', 'Hello again']
+        assert cache.get(tasks.LOCK_KEY) is None
@@ -31,9 +31,15 @@ class ProductImageInline(admin.TabularInline):
     readonly_fields = ['thumbnail']
 
     def thumbnail(self, instance):
+        if instance.renditions_ready:
+            return format_html(
+                '<picture><source srcset="{}" type="image/webp" />'
+                '<img src="{}" class="thumbnail" /></picture>',
+                instance.thumbnail_webp.url, instance.thumbnail.url)
         if instance.image.name != '':
+            # renditions not generated yet
             return format_html(
-                f'<img src="{instance.image.url}" class="thumbnail" />')
+                '<img src="{}" class="thumbnail" />', instance.image.url)
         return ''
 
 
@@ -70,6 +76,7 @@ class ProductAdmin(admin.ModelAdmin):
 
     @admin.action(description='Clear inventory')
     def clear_inventory(self, request, queryset):
+        # update() bumps the cached products' versions
         updated_count = queryset.update(inventory=0)
         # every ModelAdmin has message_user() method
         self.message_user(
@@ -136,12 +143,14 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(models.Collection)
 class CollectionAdmin(admin.ModelAdmin):
     autocomplete_fields = ['featured_product']
-    list_display = ['title', 'products_count']
+    list_display = ['title', 'products_count_link']
     list_per_page = 10
     search_fields = ['title']
 
-    @admin.display(ordering='products_counter')
-    def products_count(self, collection):
+    # named differently from the products_count field,
+    # admin would show the bare field instead of the link
+    @admin.display(ordering='products_count', description='products count')
+    def products_count_link(self, collection):
         # reverse formula: reverse('admin:app_target-model_target-page')
         url = (
             reverse('admin:store_product_changelist')
@@ -149,14 +158,7 @@ class CollectionAdmin(admin.ModelAdmin):
             + urlencode({
                 'collection__id': str(collection.id)
             }))
-        return format_html('<a href="{}">{}</a>', url, collection.products_counter)
-    
-    # ModelAdmin has get_queryset() method
-    # get_queryset() returns parent model of self
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_counter=Count('products')
-        )
+        return format_html('<a href="{}">{}</a>', url, collection.products_count)
 
 # admin.site.register(models.Customer, CustomerAdmin)
 # below is another way to make ProductAdmin an admin model for Product class
@@ -8,3 +8,4 @@ class StoreConfig(AppConfig):
     def ready(self):
         # is called when app(store) is initialized
         import store.signals.handlers
+        import store.checks
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Blob
+from .storage import image_storage
+
+
+# Reference counts of the files in the image storage (store/storage.py).
+# A Blob row counts the ProductImage fields pointing at a file, signals
+# in store/signals/handlers.py retain and release them as images are
+# saved and deleted. Files nobody points at anymore are deleted by
+# delete_orphans() once they've been unreferenced for GRACE seconds.
+
+
+def get_config():
+    return {
+        'GRACE': 60 * 10,
+        **getattr(settings, 'STORE_BLOBS', {})
+    }
+
+
+def retain(names):
+    for name in filter(None, names):
+        with transaction.atomic():
+            # waits for a delete_orphans() that has the row locked,
+            # if it deleted the blob the row is created again
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                _, created = Blob.objects.get_or_create(name=name, defaults={'refcount': 1})
+                if created:
+                    continue
+            Blob.objects.filter(name=name).update(
+                refcount=F('refcount') + 1, updated_at=timezone.now())
+
+
+def release(names):
+    for name in filter(None, names):
+        # files stored before blobs existed have no row, they're kept
+        Blob.objects.filter(name=name, refcount__gt=0).update(
+            refcount=F('refcount') - 1, updated_at=timezone.now())
+
+
+def touch(name):
+    # An upload found `name` already stored: restart the grace period so
+    # delete_orphans() leaves the file to the retain() that follows.
+    # Waits for a delete_orphans() that has the row locked, the caller
+    # has to check the file is still there afterwards.
+    Blob.objects.filter(name=name).update(updated_at=timezone.now())
+
+
+def delete_orphans():
+    # the grace period covers an upload that found the file already
+    # stored but hasn't retained it yet
+    expired = timezone.now() - timedelta(seconds=get_config()['GRACE'])
+    count = 0
+    with transaction.atomic():
+        orphans = Blob.objects \
+            .select_for_update(skip_locked=True) \
+            .filter(refcount=0, updated_at__lte=expired)
+        for blob in orphans:
+            # checked again under the lock, a retain() or touch()
+            # may have got to the row first
+            deleted, _ = Blob.objects \
+                .filter(pk=blob.pk, refcount=0, updated_at__lte=expired) \
+                .delete()
+            if deleted:
+                # before the row lock is released, see ContentAddressedStorage
+                image_storage().delete(blob.name)
+                count += 1
+    return count
@@ -0,0 +1,196 @@
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+# Read-through cache for serialized product payloads.
+# Keys embed version counters, so a write never deletes anything:
+# it bumps a counter and old entries simply become unreachable
+# (and fall out of the LRU / expire from the shared cache).
+CATALOG_VERSION = 'store:v:catalog'
+
+
+def product_version_key(product_id):
+    return f'store:v:product:{product_id}'
+
+
+def collection_version_key(collection_id):
+    return f'store:v:collection:{collection_id}'
+
+
+class LocalLRUBackend:
+    # per worker process, bounded by max_entries; timeout (seconds)
+    # caps how stale an entry gets if a bump never reaches this process
+    def __init__(self, max_entries=1000, timeout=None, **kwargs):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                expires, value = self._data[key]
+            except KeyError:
+                return None
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        expires = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SharedCacheBackend:
+    # shared between workers through one of settings.CACHES (e.g. redis)
+    def __init__(self, alias='default', timeout=None, **kwargs):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ProductCache:
+    def __init__(self, backends, versions_alias='default'):
+        self.backends = backends
+        self.versions_alias = versions_alias
+
+    @property
+    def versions(self):
+        return caches[self.versions_alias]
+
+    def get(self, key):
+        for i, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                # back-fill the faster backends we missed on
+                for faster in self.backends[:i]:
+                    faster.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value):
+        for backend in self.backends:
+            backend.set(key, value)
+
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+
+    def get_versions(self, keys):
+        found = self.versions.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            # seed from the clock so a counter that was evicted
+            # never comes back with a value that was already used
+            seed = time.time_ns()
+            for key in missing:
+                self.versions.add(key, seed, None)
+            found.update(self.versions.get_many(missing))
+        return [found[key] for key in keys]
+
+    def bump(self, keys):
+        for key in keys:
+            try:
+                self.versions.incr(key)
+            except ValueError:
+                self.versions.add(key, time.time_ns(), None)
+
+    def detail_key(self, request, product_id):
+        [version] = self.get_versions([product_version_key(product_id)])
+        return self._make_key(request, 'detail', product_id, version)
+
+    def list_key(self, request):
+        collection_id = request.query_params.get('collection_id', '')
+        if collection_id.isdigit():
+            version_key = collection_version_key(collection_id)
+        else:
+            version_key = CATALOG_VERSION
+        [version] = self.get_versions([version_key])
+        return self._make_key(
+            request, 'list', normalize_query(request), version)
+
+    def collection_key(self, request, collection_id=None):
+        # collections aren't cached, the key only backs their ETag;
+        # product writes bump the counters too (products_count)
+        if collection_id is None:
+            version_key = CATALOG_VERSION
+        else:
+            version_key = collection_version_key(collection_id)
+        [version] = self.get_versions([version_key])
+        return self._make_key(
+            request, 'collections', collection_id, normalize_query(request), version)
+
+    def etag(self, key):
+        # keys change whenever the versions they embed are bumped
+        return f'"{key.rsplit(":", 1)[-1]}"'
+
+    def _make_key(self, request, *parts):
+        # payloads contain absolute urls (images, next/previous)
+        origin = request.build_absolute_uri('/')
+        raw = ':'.join(str(part) for part in (origin, *parts))
+        return 'store:products:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def normalize_query(request):
+    # ?b=2&a=1 and ?a=1&b=2 should share one cache entry
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    return urlencode(params)
+
+
+def bump_versions(product_ids=(), collection_ids=()):
+    keys = [CATALOG_VERSION]
+    keys += [product_version_key(pk) for pk in set(product_ids) if pk]
+    keys += [collection_version_key(pk) for pk in set(collection_ids) if pk]
+
+    product_cache.bump(keys)
+    # bump again after commit, so a reader that raced the open
+    # transaction can't leave old rows under the new version
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: product_cache.bump(keys))
+
+
+def build_product_cache():
+    config = settings.STORE_CACHE
+    backends = [
+        import_string(backend['BACKEND'])(**backend.get('OPTIONS', {}))
+        for backend in config['BACKENDS']
+    ]
+    return ProductCache(backends, config.get('VERSIONS', 'default'))
+
+
+product_cache = build_product_cache()
@@ -0,0 +1,450 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from decimal import Decimal
+from threading import Lock
+from time import monotonic
+from uuid import UUID, uuid4
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.module_loading import import_string
+from .models import Cart, CartItem, Product
+
+
+# Where anonymous carts live. Views & serializers only talk to `cart_store`,
+# every backend hands back Cart/CartItem instances (with items & products
+# already attached) so the serializers and the REST contract don't change.
+#
+# Key-value backends only touch SQL to read products,
+# carts become rows only at checkout (CreateOrderSerializer.save).
+class DatabaseCartStore:
+    def __init__(self, **kwargs):
+        pass
+
+    def create(self):
+        cart = Cart.objects.create()
+        # a new cart is empty, no need to query its items back
+        cart._prefetched_objects_cache = {'items': []}
+        cart.total_price = Decimal(0)
+        return cart
+
+    def all(self):
+        return Cart.objects.with_totals()
+
+    def get(self, cart_id):
+        try:
+            return self.all().filter(pk=cart_id).first()
+        except ValidationError:
+            return None
+
+    def delete(self, cart_id):
+        try:
+            deleted, _ = Cart.objects.filter(pk=cart_id).delete()
+        except ValidationError:
+            return False
+        return deleted > 0
+
+    def delete_on_commit(self, cart_id):
+        # at checkout, the rows go away in the order's transaction
+        self.delete(cart_id)
+
+    def checkout_items(self, cart_id):
+        # {product_id: quantity}, None if there's no such cart.
+        # The rows stay locked until the order's transaction ends,
+        # so the same cart can't be checked out twice at once.
+        try:
+            items = dict(
+                CartItem.objects
+                .select_for_update()
+                .filter(cart_id=cart_id)
+                .values_list('product_id', 'quantity'))
+        except ValidationError:
+            return None
+        if not items and not Cart.objects.filter(pk=cart_id).exists():
+            return None
+        return items
+
+    def release_checkout(self, cart_id):
+        # the row locks went away with the rolled back transaction
+        pass
+
+    def get_items(self, cart_id):
+        try:
+            return list(
+                CartItem.objects
+                .filter(cart_id=cart_id)
+                .with_totals())
+        except ValidationError:
+            return []
+
+    def get_item(self, cart_id, item_id):
+        try:
+            return CartItem.objects \
+                .filter(cart_id=cart_id, pk=item_id) \
+                .with_totals() \
+                .first()
+        except (ValidationError, ValueError):
+            return None
+
+    def add_item(self, cart_id, product_id, quantity):
+        # raises Cart.DoesNotExist / Product.DoesNotExist
+        try:
+            item = CartItem.objects.add(cart_id, product_id, quantity)
+        except ValidationError:
+            raise Cart.DoesNotExist
+        if item is None:
+            if not Cart.objects.filter(pk=cart_id).exists():
+                raise Cart.DoesNotExist
+            raise Product.DoesNotExist
+        return item
+
+    def update_item(self, item, quantity):
+        item.quantity = quantity
+        item.save(update_fields=['quantity'])
+        return item
+
+    def delete_item(self, item):
+        item.delete()
+
+
+class KeyValueCartStore(ABC):
+    # A cart is {product_id: quantity} plus its creation time.
+    # The product id doubles as the cart item id, ids only need
+    # to be unique within a cart for /carts/:id/items/:item_id.
+    def __init__(self, timeout=60 * 60 * 24 * 7, checkout_timeout=60, **kwargs):
+        self.timeout = timeout
+        self.checkout_timeout = checkout_timeout
+
+    def create(self):
+        cart_id = str(uuid4())
+        created_at = datetime.now(timezone.utc)
+        self._create(cart_id, created_at.isoformat())
+        return self._build(cart_id, created_at.isoformat(), {})
+
+    def all(self):
+        carts = [
+            (cart_id, self._load(cart_id)) for cart_id in self._cart_ids()
+        ]
+        return [
+            self._build(cart_id, *data) for cart_id, data in carts
+            if data is not None
+        ]
+
+    def get(self, cart_id):
+        cart_id = self._clean_id(cart_id)
+        data = cart_id and self._load(cart_id)
+        if not data:
+            return None
+        return self._build(cart_id, *data)
+
+    def delete(self, cart_id):
+        cart_id = self._clean_id(cart_id)
+        return bool(cart_id) and self._delete(cart_id)
+
+    def delete_on_commit(self, cart_id):
+        # the key-value store isn't part of the order's transaction,
+        # only drop the cart once the order is committed
+        transaction.on_commit(lambda: self.delete(cart_id))
+
+    def checkout_items(self, cart_id):
+        # There are no rows to lock, the cart is claimed instead: until
+        # the order commits (the cart is deleted), rolls back
+        # (release_checkout) or checkout_timeout passes (the process
+        # died), checking the same cart out again finds no cart.
+        cart_id = self._clean_id(cart_id)
+        if not cart_id or not self._claim(cart_id):
+            return None
+        data = self._load(cart_id)
+        if not data:
+            self._unclaim(cart_id)
+            return None
+        created_at, quantities = data
+        return dict(quantities)
+
+    def release_checkout(self, cart_id):
+        cart_id = self._clean_id(cart_id)
+        if cart_id:
+            self._unclaim(cart_id)
+
+    def get_items(self, cart_id):
+        cart = self.get(cart_id)
+        return list(cart.items.all()) if cart else []
+
+    def get_item(self, cart_id, item_id):
+        for item in self.get_items(cart_id):
+            if str(item.id) == str(item_id):
+                return item
+        return None
+
+    def add_item(self, cart_id, product_id, quantity):
+        cart_id = self._clean_id(cart_id)
+        if not cart_id:
+            raise Cart.DoesNotExist
+        product = Product.objects \
+            .only('id', 'title', 'unit_price') \
+            .filter(pk=product_id) \
+            .first()
+        if product is None:
+            raise Product.DoesNotExist
+
+        quantity = self._incr(cart_id, product.id, quantity)
+        if quantity is None:
+            raise Cart.DoesNotExist
+        return self._build_item(cart_id, product, quantity)
+
+    def update_item(self, item, quantity):
+        if self._set(str(item.cart_id), item.product_id, quantity):
+            item.quantity = quantity
+        return item
+
+    def delete_item(self, item):
+        self._remove(str(item.cart_id), item.product_id)
+
+    def _clean_id(self, cart_id):
+        try:
+            return str(UUID(str(cart_id)))
+        except ValueError:
+            return None
+
+    def _build(self, cart_id, created_at, quantities):
+        products = Product.objects \
+            .only('id', 'title', 'unit_price') \
+            .in_bulk([int(product_id) for product_id in quantities])
+        # products deleted since they were added drop out,
+        # same as the ON DELETE CASCADE of the SQL cart
+        items = [
+            self._build_item(cart_id, products[int(product_id)], quantity)
+            for product_id, quantity in quantities.items()
+            if int(product_id) in products
+        ]
+        cart = Cart(id=UUID(cart_id), created_at=datetime.fromisoformat(created_at))
+        # looks like Cart.objects.with_totals() to the serializers
+        cart._prefetched_objects_cache = {'items': items}
+        cart.total_price = sum(
+            (item.total_price for item in items), Decimal(0))
+        return cart
+
+    def _build_item(self, cart_id, product, quantity):
+        item = CartItem(
+            id=product.id,
+            cart_id=UUID(cart_id),
+            product=product,
+            quantity=int(quantity))
+        item.total_price = item.quantity * product.unit_price
+        return item
+
+    # storage primitives, all of them refresh the cart's ttl
+    @abstractmethod
+    def _create(self, cart_id, created_at):
+        ...
+
+    @abstractmethod
+    def _load(self, cart_id):
+        # (created_at, {product_id: quantity}) or None
+        ...
+
+    @abstractmethod
+    def _incr(self, cart_id, product_id, quantity):
+        # new quantity, None if the cart doesn't exist
+        ...
+
+    @abstractmethod
+    def _set(self, cart_id, product_id, quantity):
+        ...
+
+    @abstractmethod
+    def _remove(self, cart_id, product_id):
+        ...
+
+    @abstractmethod
+    def _delete(self, cart_id):
+        # drops the checkout claim too
+        ...
+
+    @abstractmethod
+    def _cart_ids(self):
+        ...
+
+    @abstractmethod
+    def _claim(self, cart_id):
+        # True if nobody else is checking the cart out, atomically
+        # marks it as being checked out for checkout_timeout seconds
+        ...
+
+    @abstractmethod
+    def _unclaim(self, cart_id):
+        ...
+
+
+class LocalCartStore(KeyValueCartStore):
+    # in-process stand-in for RedisCartStore, for tests & development
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._carts = {}
+        self._claims = {}
+        self._lock = Lock()
+
+    def _live(self, cart_id):
+        entry = self._carts.get(cart_id)
+        if entry is None:
+            return None
+        if entry['expires'] < monotonic():
+            del self._carts[cart_id]
+            return None
+        entry['expires'] = monotonic() + self.timeout
+        return entry
+
+    def _create(self, cart_id, created_at):
+        with self._lock:
+            self._carts[cart_id] = {
+                'created_at': created_at,
+                'items': {},
+                'expires': monotonic() + self.timeout
+            }
+
+    def _load(self, cart_id):
+        with self._lock:
+            entry = self._live(cart_id)
+            if entry is None:
+                return None
+            return entry['created_at'], dict(entry['items'])
+
+    def _incr(self, cart_id, product_id, quantity):
+        with self._lock:
+            entry = self._live(cart_id)
+            if entry is None:
+                return None
+            items = entry['items']
+            items[product_id] = items.get(product_id, 0) + quantity
+            return items[product_id]
+
+    def _set(self, cart_id, product_id, quantity):
+        with self._lock:
+            entry = self._live(cart_id)
+            if entry is None or product_id not in entry['items']:
+                return False
+            entry['items'][product_id] = quantity
+            return True
+
+    def _remove(self, cart_id, product_id):
+        with self._lock:
+            entry = self._live(cart_id)
+            if entry is not None:
+                entry['items'].pop(product_id, None)
+
+    def _delete(self, cart_id):
+        with self._lock:
+            self._claims.pop(cart_id, None)
+            return self._carts.pop(cart_id, None) is not None
+
+    def _cart_ids(self):
+        with self._lock:
+            return list(self._carts)
+
+    def _claim(self, cart_id):
+        with self._lock:
+            if self._claims.get(cart_id, 0) > monotonic():
+                return False
+            self._claims[cart_id] = monotonic() + self.checkout_timeout
+            return True
+
+    def _unclaim(self, cart_id):
+        with self._lock:
+            self._claims.pop(cart_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._carts.clear()
+            self._claims.clear()
+
+
+class RedisCartStore(KeyValueCartStore):
+    # one hash per cart: 'created_at' + one field per product id
+    CREATED_AT = 'created_at'
+
+    # the existence check and the write have to be atomic,
+    # otherwise an add racing the ttl would resurrect a half cart
+    INCR_SCRIPT = '''
+        if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then return false end
+        local quantity = redis.call('HINCRBY', KEYS[1], ARGV[2], ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return quantity
+    '''
+    SET_SCRIPT = '''
+        if redis.call('HEXISTS', KEYS[1], ARGV[2]) == 0 then return 0 end
+        redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+        return 1
+    '''
+
+    def __init__(self, url='redis://localhost:6379/2', prefix='store:cart:',
+                 checkout_prefix='store:cart-checkout:', **kwargs):
+        super().__init__(**kwargs)
+        # redis is only needed when this backend is configured
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        # outside `prefix`, _cart_ids() mustn't see the claims
+        self.checkout_prefix = checkout_prefix
+        self._incr_script = self.redis.register_script(self.INCR_SCRIPT)
+        self._set_script = self.redis.register_script(self.SET_SCRIPT)
+
+    def _key(self, cart_id):
+        return self.prefix + cart_id
+
+    def _create(self, cart_id, created_at):
+        with self.redis.pipeline() as pipe:
+            pipe.hset(self._key(cart_id), self.CREATED_AT, created_at)
+            pipe.expire(self._key(cart_id), self.timeout)
+            pipe.execute()
+
+    def _load(self, cart_id):
+        with self.redis.pipeline() as pipe:
+            pipe.hgetall(self._key(cart_id))
+            pipe.expire(self._key(cart_id), self.timeout)
+            data, _ = pipe.execute()
+        created_at = data.pop(self.CREATED_AT, None)
+        if created_at is None:
+            return None
+        return created_at, {int(key): int(value) for key, value in data.items()}
+
+    def _incr(self, cart_id, product_id, quantity):
+        return self._incr_script(
+            keys=[self._key(cart_id)],
+            args=[self.CREATED_AT, product_id, quantity, self.timeout])
+
+    def _set(self, cart_id, product_id, quantity):
+        return bool(self._set_script(
+            keys=[self._key(cart_id)],
+            args=[self.CREATED_AT, product_id, quantity, self.timeout]))
+
+    def _remove(self, cart_id, product_id):
+        self.redis.hdel(self._key(cart_id), product_id)
+
+    def _delete(self, cart_id):
+        with self.redis.pipeline() as pipe:
+            pipe.delete(self._key(cart_id))
+            pipe.delete(self.checkout_prefix + cart_id)
+            deleted, _ = pipe.execute()
+        return deleted > 0
+
+    def _cart_ids(self):
+        return [
+            key[len(self.prefix):]
+            for key in self.redis.scan_iter(match=self.prefix + '*')
+        ]
+
+    def _claim(self, cart_id):
+        return bool(self.redis.set(
+            self.checkout_prefix + cart_id, 1, nx=True, ex=self.checkout_timeout))
+
+    def _unclaim(self, cart_id):
+        self.redis.delete(self.checkout_prefix + cart_id)
+
+
+def build_cart_store():
+    config = settings.STORE_CARTS
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+cart_store = build_cart_store()
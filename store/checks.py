@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# caches every worker process has its own copy of
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def check_shared_cache(alias, setting, id):
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"{setting} is {alias!r}, a {backend.rsplit('.', 1)[-1]} "
+            "that isn't shared between worker processes.",
+            hint="Point it at a shared cache (e.g. set REDIS_URL), or silence "
+                 f"{id} if the site runs in a single process.",
+            id=id,
+        )
+    ]
+
+
+@register(Tags.caches)
+def check_product_cache_versions(app_configs, **kwargs):
+    # a bump only reaches the process that made it when the version
+    # counters aren't shared, the others keep serving the old payloads
+    return check_shared_cache(
+        settings.STORE_CACHE.get('VERSIONS', 'default'),
+        "STORE_CACHE['VERSIONS']", 'store.E001')
+
+
+@register(Tags.caches)
+def check_outbox_handled_cache(app_configs, **kwargs):
+    # a redelivered event reaches another worker, which would run
+    # an idempotent receiver's side effects again
+    from .outbox import HANDLED_CACHE
+    return check_shared_cache(HANDLED_CACHE, 'store.outbox.HANDLED_CACHE', 'store.E002')
@@ -1,5 +1,9 @@
+from django.contrib.postgres.search import SearchRank
+from django.db.models import F
 from django_filters.rest_framework import FilterSet
+from rest_framework.filters import SearchFilter
 from .models import Product
+from . import search
 
 
 class ProductFilter(FilterSet):
@@ -9,3 +13,21 @@ class ProductFilter(FilterSet):
             'collection_id': ['exact'],
             'unit_price': ['gt', 'lt']
         }
+
+
+class ProductSearchFilter(SearchFilter):
+    # uses Product.search_vector (GIN index) on PostgreSQL,
+    # other databases fall back to SearchFilter's ILIKE on search_fields
+    def filter_queryset(self, request, queryset, view):
+        if not search.is_supported():
+            return super().filter_queryset(request, queryset, view)
+
+        query = search.build_search_query(self.get_search_terms(request))
+        if query is None:
+            return queryset
+
+        # best matches first, ?ordering= still overrides this
+        return queryset \
+            .filter(search_vector=query) \
+            .annotate(rank=SearchRank(F('search_vector'), query)) \
+            .order_by('-rank', 'id')
@@ -0,0 +1,78 @@
+import logging
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from .models import ProductImage
+
+
+# Renditions of a ProductImage: list pages and the admin show the
+# thumbnail, product pages the medium one, each as JPEG and WebP.
+# Thumbnails are cropped to a fixed square, medium ones keep the aspect
+# ratio and are only scaled down.
+logger = logging.getLogger(__name__)
+
+# field: (size, format, crop)
+RENDITIONS = {
+    'thumbnail': ((200, 200), 'JPEG', True),
+    'thumbnail_webp': ((200, 200), 'WEBP', True),
+    'medium': ((800, 800), 'JPEG', False),
+    'medium_webp': ((800, 800), 'WEBP', False),
+}
+QUALITY = {'JPEG': 85, 'WEBP': 80}
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def resize(original, size, crop):
+    if crop:
+        return ImageOps.fit(original, size, Image.LANCZOS)
+    image = original.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+def encode(image, format):
+    has_alpha = image.mode in ('RGBA', 'LA') or \
+        (image.mode == 'P' and 'transparency' in image.info)
+    if has_alpha and format == 'JPEG':
+        # no transparency in JPEG, flatten onto white
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    buffer = BytesIO()
+    image.save(buffer, format, quality=QUALITY[format], optimize=format == 'JPEG')
+    return buffer.getvalue()
+
+
+def generate_renditions(product_image):
+    source = product_image.image.name
+    # images are stored by content, another product with the same
+    # photo may have renditions already
+    done = ProductImage.objects \
+        .filter(renditions_source=source) \
+        .exclude(pk=product_image.pk) \
+        .exclude(thumbnail='') \
+        .values(*RENDITIONS) \
+        .first()
+    if done:
+        for field, name in done.items():
+            setattr(product_image, field, name)
+    else:
+        with product_image.image.open('rb') as file:
+            original = Image.open(file)
+            # phone photos are often stored sideways with an EXIF rotation
+            original = ImageOps.exif_transpose(original)
+
+        for field, (size, format, crop) in RENDITIONS.items():
+            content = encode(resize(original, size, crop), format)
+            getattr(product_image, field).save(
+                f'{field}.{EXTENSIONS[format]}', ContentFile(content), save=False)
+
+    # renditions of a replaced image are released by the blob signals
+    product_image.renditions_source = source
+    product_image.save(update_fields=[*RENDITIONS, 'renditions_source'])
+    logger.info(
+        'Generated renditions of %s%s', source, ' (reused)' if done else '')
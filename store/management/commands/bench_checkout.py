@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from rest_framework.exceptions import ValidationError
+from store import carts
+from store.models import Collection, Customer, Order, OrderItem, OutboxEvent, Product
+from store.serializers import CreateOrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Runs many simultaneous checkouts against the same hot products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--products', type=int, default=5)
+        parser.add_argument('--inventory', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        # checkouts run on their own connections, so the data has to be
+        # committed; everything created here is deleted at the end
+        random = Random(options['seed'])
+        collection = Collection.objects.create(title='bench checkout')
+        products = [
+            Product.objects.create(
+                title=f'hot {i}', slug=f'hot-{i}', unit_price=10,
+                inventory=options['inventory'], collection=collection)
+            for i in range(options['products'])
+        ]
+        User = get_user_model()
+        users = [
+            User.objects.create(username=f'bench-checkout-{i}', email=f'bench-checkout-{i}@example.com')
+            for i in range(options['buyers'])
+        ]
+        # every cart holds several hot products in a random order
+        cart_ids = []
+        for _ in users:
+            cart = carts.cart_store.create()
+            for product in random.sample(products, k=min(3, len(products))):
+                carts.cart_store.add_item(cart.id, product.id, random.randint(1, 3))
+            cart_ids.append(cart.id)
+
+        def checkout(args):
+            user, cart_id = args
+            start = perf_counter()
+            try:
+                serializer = CreateOrderSerializer(
+                    data={'cart_id': cart_id}, context={'user_id': user.id})
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                return 'ok', perf_counter() - start
+            except ValidationError:
+                return 'out of stock', perf_counter() - start
+            except OperationalError as error:
+                # deadlocks surface as OperationalError on postgres
+                return f'error: {error}', perf_counter() - start
+            finally:
+                connection.close()
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(checkout, zip(users, cart_ids)))
+        elapsed = perf_counter() - start
+
+        outcomes = {}
+        for outcome, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(duration for _, duration in results)
+        sold = OrderItem.objects.filter(product__in=products)
+        inventories = Product.objects \
+            .filter(pk__in=[p.id for p in products]) \
+            .values_list('inventory', flat=True)
+        oversold = any(inventory < 0 for inventory in inventories)
+        consistent = sum(item.quantity for item in sold) + sum(inventories) \
+            == options['inventory'] * len(products)
+
+        self.stdout.write(
+            f'{len(results)} checkouts, {options["threads"]} threads, '
+            f'{len(products)} hot products x {options["inventory"]} in stock')
+        self.stdout.write(f'  throughput: {len(results) / elapsed:.1f} checkouts/s')
+        self.stdout.write(
+            f'  latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+            f'p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms')
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f'  {outcome}: {count}')
+        self.stdout.write(f'  oversold: {oversold}, inventory consistent: {consistent}')
+
+        for cart_id in cart_ids:
+            carts.cart_store.delete(cart_id)
+        OrderItem.objects.filter(product__in=products).delete()
+        orders = Order.objects.filter(customer__user__in=users)
+        OutboxEvent.objects \
+            .filter(payload__order_id__in=list(orders.values_list('id', flat=True))) \
+            .delete()
+        Order.objects.filter(customer__user__in=users).delete()
+        Customer.objects.filter(user__in=users).delete()
+        User.objects.filter(pk__in=[user.id for user in users]).delete()
+        Product.objects.filter(pk__in=[p.id for p in products]).delete()
+        collection.delete()
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from time import perf_counter
+from urllib.error import HTTPError, URLError
+from urllib.request import urlopen
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Hammers a running server and reports requests/s, e.g. to compare settings profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', nargs='?', default='http://localhost:8000/store/products/{id}/',
+            help='{id} is replaced with a random id from --ids')
+        parser.add_argument('--ids', default='1-1000')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        low, high = (int(i) for i in options['ids'].split('-'))
+        deadline = perf_counter() + options['seconds']
+
+        def worker(seed):
+            random = Random(seed)
+            latencies, errors = [], 0
+            while perf_counter() < deadline:
+                url = options['url'].format(id=random.randint(low, high))
+                start = perf_counter()
+                try:
+                    with urlopen(url, timeout=10) as response:
+                        response.read()
+                except HTTPError as error:
+                    # a missing product is still a served request
+                    if error.code >= 500:
+                        errors += 1
+                except URLError:
+                    errors += 1
+                latencies.append(perf_counter() - start)
+            return latencies, errors
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(
+                worker, [options['seed'] + i for i in range(options['concurrency'])]))
+        elapsed = perf_counter() - start
+
+        latencies = sorted(l for latencies, _ in results for l in latencies)
+        errors = sum(errors for _, errors in results)
+        self.stdout.write(
+            f'{len(latencies)} requests in {elapsed:.1f}s, '
+            f'{options["concurrency"]} concurrent: {len(latencies) / elapsed:.1f} req/s')
+        if latencies:
+            self.stdout.write(
+                f'  latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms, '
+                f'p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms')
+        self.stdout.write(f'  errors: {errors}')
@@ -0,0 +1,55 @@
+from io import BytesIO
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+from store.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = 'Compares disk usage and save latency of plain and content addressed image storage on a catalog full of duplicate photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos', type=int, default=20, help='distinct photos')
+        parser.add_argument('--uploads', type=int, default=500)
+        parser.add_argument('--size', default='1200x900')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        width, height = (int(i) for i in options['size'].split('x'))
+        self.stdout.write(f'Generating {options["photos"]} photos...')
+        photos = []
+        for _ in range(options['photos']):
+            buffer = BytesIO()
+            Image.effect_noise((width, height), 32).convert('RGB').save(buffer, 'JPEG')
+            photos.append(buffer.getvalue())
+        # a few vendor photos reused for many SKUs
+        random = Random(options['seed'])
+        uploads = [random.choice(photos) for _ in range(options['uploads'])]
+
+        self.stdout.write(
+            f'{options["uploads"]} uploads of {len(set(uploads))} distinct photos, '
+            f'{sum(map(len, uploads)) / 1024 / 1024:.1f} MB uploaded')
+        for label, storage_class in (
+                ('plain', FileSystemStorage),
+                ('content addressed', ContentAddressedStorage)):
+            with TemporaryDirectory() as location:
+                storage = storage_class(location=location)
+                latencies = []
+                for i, content in enumerate(uploads):
+                    upload = SimpleUploadedFile(f'photo{i}.jpg', content)
+                    start = perf_counter()
+                    storage.save(f'store/images/photo{i}.jpg', upload)
+                    latencies.append(perf_counter() - start)
+                files = [path for path in Path(location).rglob('*') if path.is_file()]
+                disk = sum(path.stat().st_size for path in files)
+
+            latencies.sort()
+            self.stdout.write(
+                f'  {label:17}: {len(files):5} files, {disk / 1024 / 1024:7.1f} MB on disk, '
+                f'save p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, '
+                f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms')
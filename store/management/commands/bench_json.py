@@ -0,0 +1,75 @@
+from io import BytesIO
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from store.models import Cart, CartItem, Collection, Product
+from store.serializers import CartSerializer, ProductSerializer
+
+try:
+    from core.parsers import ORJSONParser
+    from core.renderers import ORJSONRenderer
+    import orjson  # noqa: F401
+except ImportError:
+    orjson = None
+
+
+class Command(BaseCommand):
+    help = 'Compares the stock JSON renderer/parser with the orjson ones on a product page and a big cart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--cart-items', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError('orjson is not installed')
+
+        # rows are created in a transaction that is rolled back,
+        # only the serialized data is kept
+        with transaction.atomic():
+            collection = Collection.objects.create(title='bench')
+            products = Product.objects.bulk_create([
+                Product(
+                    title=f'bench {i}',
+                    slug=f'bench-{i}',
+                    description='Lorem ipsum dolor sit amet ' * 5,
+                    unit_price=1 + i % 500,
+                    inventory=10,
+                    collection=collection
+                ) for i in range(max(options['products'], options['cart_items']))
+            ])
+            cart = Cart.objects.create()
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product=product, quantity=1 + i % 5)
+                for i, product in enumerate(products[:options['cart_items']])
+            ])
+
+            page = ProductSerializer(
+                Product.objects.prefetch_related('product_images')
+                .filter(collection=collection).order_by('id')[:options['products']],
+                many=True).data
+            cart = CartSerializer(Cart.objects.with_totals().get(id=cart.id)).data
+            transaction.set_rollback(True)
+
+        repeat = options['repeat']
+        for name, data in (
+                (f'{options["products"]} products', page),
+                (f'cart with {options["cart_items"]} items', cart)):
+            stock, fast = JSONRenderer().render(data), ORJSONRenderer().render(data)
+            self.stdout.write(f'{name}: {len(stock)} bytes, identical output: {stock == fast}')
+            for label, renderer, parser in (
+                    ('json  ', JSONRenderer(), JSONParser()),
+                    ('orjson', ORJSONRenderer(), ORJSONParser())):
+                render_ms = self.measure(lambda: renderer.render(data), repeat)
+                parse_ms = self.measure(lambda: parser.parse(BytesIO(stock)), repeat)
+                self.stdout.write(
+                    f'  {label} render: {render_ms:7.3f} ms, parse: {parse_ms:7.3f} ms')
+
+    def measure(self, fn, repeat):
+        start = perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (perf_counter() - start) / repeat * 1000
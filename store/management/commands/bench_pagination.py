@@ -0,0 +1,105 @@
+from time import perf_counter
+from urllib.parse import parse_qs, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from store.models import Collection, Product
+from store.pagination import DefaultPagination, KeysetPagination
+from store.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compares page-number and keyset pagination latency on a deep product page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--ordering', default='unit_price')
+
+    def handle(self, *args, **options):
+        page = options['page']
+        needed = page * DefaultPagination.page_size
+
+        # everything runs in a transaction that is rolled back,
+        # so missing rows can be generated without polluting the DB
+        with transaction.atomic():
+            self.ensure_products(needed)
+            ordering = options['ordering']
+            tie_breaker = '-id' if ordering.startswith('-') else 'id'
+            queryset = ProductViewSet.queryset.order_by(ordering, tie_breaker)
+            # localhost is always allowed while DEBUG is on
+            factory = APIRequestFactory(HTTP_HOST='localhost')
+
+            page_request = Request(factory.get(
+                '/store/products/',
+                {'page': page, 'ordering': ordering}))
+            offset_ms, offset_queries = self.measure(
+                DefaultPagination, queryset, page_request, options['repeat'])
+
+            # cursor pointing at the last row of page-1, i.e. what a client
+            # following 'next' links would send when asking for that page
+            last = queryset[needed - DefaultPagination.page_size - 1]
+            cursor = KeysetPagination()
+            cursor.base_url = 'http://localhost/store/products/'
+            cursor.field = ordering.lstrip('-')
+            cursor.model_field = Product._meta.get_field(cursor.field)
+            [encoded] = parse_qs(urlsplit(
+                cursor.encode_cursor(last, reverse=False)).query)['cursor']
+            # with a data dict RequestFactory drops the path's query string,
+            # the cursor has to be part of it
+            cursor_request = Request(factory.get(
+                '/store/products/',
+                {'pagination': 'cursor', 'ordering': ordering, 'cursor': encoded}))
+            keyset_ms, keyset_queries = self.measure(
+                KeysetPagination, queryset, cursor_request, options['repeat'],
+                view=ProductViewSet)
+
+            # both have to land on the requested page, not on page 1
+            expected = queryset[needed - DefaultPagination.page_size].pk
+            for pagination_class, request, view in (
+                    (DefaultPagination, page_request, None),
+                    (KeysetPagination, cursor_request, ProductViewSet)):
+                rows = pagination_class().paginate_queryset(queryset, request, view=view)
+                if list(rows)[0].pk != expected:
+                    raise CommandError(
+                        f'{pagination_class.__name__} did not return page {page}')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'page {page}, ordering={ordering}, {options["repeat"]} runs')
+        self.stdout.write(f'  page number: {offset_ms:8.2f} ms/page, {offset_queries} queries')
+        self.stdout.write(f'  keyset:      {keyset_ms:8.2f} ms/page, {keyset_queries} queries')
+
+    def ensure_products(self, count):
+        missing = count - Product.objects.count()
+        if missing <= 0:
+            return
+        self.stdout.write(f'Generating {missing} temporary products...')
+        collection = Collection.objects.create(title='bench')
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f'bench {i}',
+                    slug=f'bench-{i}',
+                    unit_price=1 + i % 500,
+                    inventory=10,
+                    collection=collection
+                ) for i in range(missing)
+            ],
+            batch_size=5000
+        )
+
+    def measure(self, pagination_class, queryset, request, repeat, view=None):
+        connection.force_debug_cursor = True
+        total = 0
+        for _ in range(repeat):
+            reset_queries()
+            paginator = pagination_class()
+            start = perf_counter()
+            page = paginator.paginate_queryset(queryset, request, view=view)
+            list(page)
+            total += perf_counter() - start
+        queries = len(connection.queries)
+        connection.force_debug_cursor = False
+        return total / repeat * 1000, queries
@@ -0,0 +1,258 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from random import Random
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from store.cache import bump_versions
+from store.models import Collection, Customer, Order, OrderItem, Product
+from store.search import update_search_vectors
+
+
+# Everything is derived from --seed and the row's position, so the same
+# arguments give the same dataset (ids are offset by what's already there).
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+WORDS = [
+    'organic', 'classic', 'smoked', 'fresh', 'spicy', 'frozen', 'sweet',
+    'roasted', 'wild', 'golden', 'crispy', 'mild', 'dark', 'sparkling',
+    'apple', 'coffee', 'cheese', 'salmon', 'pepper', 'honey', 'tea',
+    'bread', 'olive', 'chocolate', 'rice', 'mango', 'garlic', 'almond'
+]
+FIRST_NAMES = ['Alex', 'Sam', 'Kim', 'Lee', 'Jo', 'Robin', 'Max', 'Ali', 'Nur', 'Eli']
+LAST_NAMES = ['Smith', 'Lee', 'Khan', 'Garcia', 'Chen', 'Ivanov', 'Karimov', 'Brown']
+
+
+class CopyLoader:
+    # COPY ... FROM STDIN, postgres only
+    name = 'copy'
+
+    def load(self, model, fields, rows):
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(f).column) for f in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        count = 0
+        with connection.cursor() as cursor:
+            with cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        return count
+
+
+class BulkCreateLoader:
+    name = 'bulk_create'
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def load(self, model, fields, rows):
+        # _base_manager skips ProductQuerySet.bulk_create's recount,
+        # collections are recounted once at the end.
+        # auto_now fields (Product.last_update) get the current time here.
+        attnames = [model._meta.get_field(f).attname for f in fields]
+        count = 0
+        batch = []
+        for row in rows:
+            batch.append(model(**dict(zip(attnames, row))))
+            if len(batch) == self.batch_size:
+                model._base_manager.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            model._base_manager.bulk_create(batch)
+            count += len(batch)
+        return count
+
+
+class Command(BaseCommand):
+    help = 'Generates a large deterministic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', type=int, default=100)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--customers', type=int, default=50_000)
+        parser.add_argument('--orders', type=int, default=200_000)
+        parser.add_argument(
+            '--items-per-order', type=int, default=3,
+            help='Average number of items in an order')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--method', choices=['auto', 'copy', 'bulk_create'], default='auto',
+            help='auto uses COPY on postgres and bulk_create elsewhere')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--skip-search-vectors', action='store_true',
+            help="Don't build product search vectors after loading")
+
+    def handle(self, *args, **options):
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk_create'
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('COPY is only available on postgres')
+        loader = CopyLoader() if method == 'copy' \
+            else BulkCreateLoader(options['batch_size'])
+        if options['collections'] < 1 and options['products'] > 0:
+            raise CommandError('Products need at least one collection')
+        if options['products'] < 1 and options['orders'] > 0:
+            raise CommandError('Orders need at least one product')
+        if options['customers'] < 1 and options['orders'] > 0:
+            raise CommandError('Orders need at least one customer')
+
+        self.seed = options['seed']
+        self.loader = loader
+        self.total_rows = 0
+        User = get_user_model()
+        start = perf_counter()
+
+        # ids are assigned here so related rows can point at them
+        # without reading anything back; don't run this next to live writes
+        with transaction.atomic():
+            collection_ids = self.load(
+                Collection, options['collections'], self.collections)
+            product_ids = self.load(
+                Product, options['products'], self.products, collection_ids)
+            user_ids = self.load(User, options['customers'], self.users)
+            customer_ids = self.load(
+                Customer, options['customers'], self.customers, user_ids)
+            order_ids = self.load(
+                Order, options['orders'], self.orders, customer_ids)
+            self.load(
+                OrderItem, options['orders'] * options['items_per_order'],
+                self.order_items, order_ids, product_ids)
+
+            self.reset_sequences([Collection, Product, User, Customer, Order, OrderItem])
+            Collection.objects \
+                .filter(pk__in=collection_ids) \
+                .recount_products()
+            # the loaders skip ProductQuerySet, new products change the lists
+            bump_versions(collection_ids=collection_ids)
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            f'{self.total_rows:,} rows in {elapsed:.1f}s '
+            f'({self.total_rows / elapsed:,.0f} rows/s) using {loader.name}')
+
+        if not options['skip_search_vectors'] and len(product_ids):
+            start = perf_counter()
+            updated = update_search_vectors(
+                Product.objects.filter(pk__gte=product_ids.start))
+            self.stdout.write(
+                f'{updated:,} search vectors in {perf_counter() - start:.1f}s')
+
+    def load(self, model, count, generate, *related):
+        first_id = (model._base_manager.aggregate(Max('pk'))['pk__max'] or 0) + 1
+        ids = range(first_id, first_id + max(count, 0))
+        # one generator per table, so changing --orders doesn't
+        # change the products
+        random = Random(f'{self.seed}:{model._meta.label}')
+        fields, rows = generate(random, ids, *related)
+
+        start = perf_counter()
+        loaded = self.loader.load(model, fields, rows)
+        elapsed = perf_counter() - start
+        self.total_rows += loaded
+        self.stdout.write(
+            f'  {model._meta.verbose_name_plural}: {loaded:,} rows in {elapsed:.1f}s '
+            f'({loaded / elapsed if elapsed else 0:,.0f} rows/s)')
+        return ids
+
+    def reset_sequences(self, models):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    def collections(self, random, ids):
+        fields = ['id', 'title', 'featured_product', 'products_count']
+        return fields, (
+            (id, f'{random.choice(WORDS).title()} {random.choice(WORDS)} {id}', None, 0)
+            for id in ids
+        )
+
+    def products(self, random, ids, collection_ids):
+        # order items copy the price, keep them compact in memory
+        self.prices = array('i')
+        fields = [
+            'id', 'title', 'slug', 'description', 'unit_price',
+            'inventory', 'last_update', 'collection', 'reviews_count'
+        ]
+
+        def rows():
+            for id in ids:
+                title = ' '.join(random.sample(WORDS, 3)).title()
+                cents = random.randint(100, 99_999)
+                self.prices.append(cents)
+                yield (
+                    id,
+                    title,
+                    f'{title.lower().replace(" ", "-")}-{id}',
+                    ' '.join(random.choices(WORDS, k=12)),
+                    Decimal(cents) / 100,
+                    random.randint(0, 500),
+                    EPOCH + timedelta(seconds=random.randint(0, 365 * 24 * 3600)),
+                    random.choice(collection_ids),
+                    0
+                )
+        return fields, rows()
+
+    def users(self, random, ids):
+        fields = [
+            'id', 'username', 'email', 'password', 'first_name', 'last_name',
+            'is_staff', 'is_active', 'is_superuser', 'date_joined'
+        ]
+        return fields, (
+            (
+                id, f'user{id}', f'user{id}@example.com',
+                # unusable password, nobody logs in as these
+                '!', random.choice(FIRST_NAMES), random.choice(LAST_NAMES),
+                False, True, False,
+                EPOCH + timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+            ) for id in ids
+        )
+
+    def customers(self, random, ids, user_ids):
+        # bulk inserts skip the signal that creates a customer per user
+        fields = ['id', 'phone', 'birth_date', 'membership', 'user']
+        memberships = [choice for choice, _ in Customer.MEMBERSHIP_CHOICES]
+        return fields, (
+            (
+                id,
+                f'+1{random.randint(2_000_000_000, 9_999_999_999)}',
+                (EPOCH - timedelta(days=random.randint(18 * 365, 80 * 365))).date(),
+                random.choice(memberships),
+                user_id
+            ) for id, user_id in zip(ids, user_ids)
+        )
+
+    def orders(self, random, ids, customer_ids):
+        fields = ['id', 'placed_at', 'payment_status', 'customer']
+        statuses = [status for status, _ in Order.PAYMENT_STATUSES]
+        return fields, (
+            (
+                id,
+                EPOCH + timedelta(seconds=random.randint(0, 365 * 24 * 3600)),
+                random.choice(statuses),
+                random.choice(customer_ids)
+            ) for id in ids
+        )
+
+    def order_items(self, random, ids, order_ids, product_ids):
+        # the item count varies per order around the average,
+        # the ids are handed out as rows are produced
+        fields = ['id', 'order', 'product', 'quantity', 'unit_price']
+        per_order = len(ids) // len(order_ids) if order_ids else 0
+
+        def rows():
+            next_id = ids.start
+            for order_id in order_ids:
+                for _ in range(random.randint(1, max(1, 2 * per_order - 1))):
+                    index = random.randrange(len(product_ids))
+                    yield (
+                        next_id, order_id, product_ids[index],
+                        random.randint(1, 5), Decimal(self.prices[index]) / 100
+                    )
+                    next_id += 1
+        return fields, rows()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from store.models import ProductImage
+from store.tasks import generate_image_renditions
+
+
+class Command(BaseCommand):
+    help = 'Queues rendition generation for product images that have none, e.g. uploaded before renditions existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--now', action='store_true',
+            help='Generate them in this process instead of queueing tasks')
+
+    def handle(self, *args, **options):
+        image_ids = ProductImage.objects \
+            .exclude(image='') \
+            .exclude(renditions_source=F('image')) \
+            .values_list('id', flat=True)
+        count = 0
+        for image_id in image_ids.iterator():
+            if options['now']:
+                generate_image_renditions(image_id)
+            else:
+                generate_image_renditions.delay(image_id)
+            count += 1
+        self.stdout.write(
+            f'{count} images were {"processed" if options["now"] else "queued"}.')
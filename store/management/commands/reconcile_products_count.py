@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F
+from store.cache import bump_versions
+from store.models import Collection
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Collection.products_count from the product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report collections whose counter drifted')
+
+    def handle(self, *args, **options):
+        drifted = Collection.objects \
+            .annotate(actual=Count('products')) \
+            .exclude(products_count=F('actual')) \
+            .values_list('id', 'title', 'products_count', 'actual')
+
+        drifted = list(drifted)
+        for id, title, stored, actual in drifted:
+            self.stdout.write(f'{id} {title}: {stored} -> {actual}')
+
+        if not options['dry_run'] and drifted:
+            collection_ids = [row[0] for row in drifted]
+            Collection.objects \
+                .filter(pk__in=collection_ids) \
+                .recount_products()
+            # the counts are in cached payloads & behind collection ETags
+            bump_versions(collection_ids=collection_ids)
+        self.stdout.write(f'{len(drifted)} collections were out of sync.')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Max, Q
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Product.reviews_count & last_review_date from the review table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report products whose stats drifted')
+
+    def handle(self, *args, **options):
+        drifted = Product.objects \
+            .annotate(actual_count=Count('reviews'), actual_date=Max('reviews__date')) \
+            .filter(
+                ~Q(reviews_count=F('actual_count'))
+                | ~Q(last_review_date=F('actual_date'))
+                | Q(last_review_date__isnull=True, actual_date__isnull=False)
+                | Q(last_review_date__isnull=False, actual_date__isnull=True)) \
+            .values_list('id', 'title', 'reviews_count', 'actual_count')
+
+        drifted = list(drifted)
+        for id, title, stored, actual in drifted:
+            self.stdout.write(f'{id} {title}: {stored} -> {actual}')
+
+        if not options['dry_run'] and drifted:
+            # ProductQuerySet.update() bumps the products' cache versions
+            Product.objects \
+                .filter(pk__in=[row[0] for row in drifted]) \
+                .recount_reviews()
+        self.stdout.write(f'{len(drifted)} products were out of sync.')
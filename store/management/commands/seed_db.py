@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.db import connection
 from pathlib import Path
+from store.search import update_search_vectors
 import os
 
 
@@ -15,3 +16,6 @@ class Command(BaseCommand):
 
         with connection.cursor() as cursor:
             cursor.execute(sql)
+
+        # raw inserts skip the signals that maintain search vectors
+        update_search_vectors()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.search import is_supported, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Product.search_vector, e.g. after bulk_create() or update()'
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stdout.write('Full-text search needs PostgreSQL, nothing to do.')
+            return
+        updated = update_search_vectors()
+        self.stdout.write(f'{updated} products were updated.')
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:15
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=['search_vector'], name='store_product_search_gin')
+
+
+# GIN indexes & tsvectors only exist on PostgreSQL,
+# on other databases the column stays empty and search uses ILIKE
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('store', 'Product'), SEARCH_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('store', 'Product'), SEARCH_INDEX)
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("""
+        UPDATE store_product AS p SET search_vector =
+            setweight(to_tsvector('english', coalesce(p.title, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(c.title, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(p.description, '')), 'C')
+        FROM store_collection AS c
+        WHERE c.id = p.collection_id
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='product', index=SEARCH_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_index, drop_search_index),
+            ],
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
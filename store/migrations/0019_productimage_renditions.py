@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='medium',
+            field=models.ImageField(blank=True, editable=False, upload_to='store/images/renditions'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='medium_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='store/images/renditions'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='renditions_source',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='store/images/renditions'),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='thumbnail_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='store/images/renditions'),
+        ),
+    ]
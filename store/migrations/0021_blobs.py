@@ -0,0 +1,74 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:51
+
+from collections import Counter
+import store.storage
+import store.validators
+from django.db import migrations, models
+
+
+FILE_FIELDS = ['image', 'thumbnail', 'thumbnail_webp', 'medium', 'medium_webp']
+
+
+def count_existing_references(apps, schema_editor):
+    # files uploaded before blobs existed, so they get
+    # deleted too once nothing points at them
+    ProductImage = apps.get_model('store', 'ProductImage')
+    Blob = apps.get_model('store', 'Blob')
+    refcounts = Counter()
+    for names in ProductImage.objects.values_list(*FILE_FIELDS).iterator():
+        refcounts.update(name for name in names if name)
+    Blob.objects.bulk_create(
+        [Blob(name=name, refcount=count) for name, count in refcounts.items()],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_imageupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=store.storage.image_storage, upload_to='store/images', validators=[store.validators.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='medium',
+            field=models.ImageField(blank=True, editable=False, storage=store.storage.image_storage, upload_to='store/images/renditions'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='medium_webp',
+            field=models.ImageField(blank=True, editable=False, storage=store.storage.image_storage, upload_to='store/images/renditions'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='renditions_source',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, storage=store.storage.image_storage, upload_to='store/images/renditions'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='thumbnail_webp',
+            field=models.ImageField(blank=True, editable=False, storage=store.storage.image_storage, upload_to='store/images/renditions'),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refcount', 0)), fields=['updated_at'], name='store_blob_orphans_idx')],
+            },
+        ),
+        migrations.RunPython(count_existing_references, migrations.RunPython.noop),
+    ]
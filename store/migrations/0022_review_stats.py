@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:56
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+
+
+def count_existing_reviews(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+    reviews = Review.objects \
+        .filter(product=OuterRef('pk')) \
+        .order_by() \
+        .values('product')
+    Product.objects.filter(reviews__isnull=False).update(
+        reviews_count=Subquery(reviews.annotate(count=Count('id')).values('count')),
+        last_review_date=Subquery(reviews.annotate(latest=Max('date')).values('latest')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='last_review_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'date', 'id'], name='store_review_product_date_idx'),
+        ),
+        migrations.RunPython(count_existing_reviews, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,16 @@
 # store/models.py
 from django.contrib import admin
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, FileExtensionValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, Max, OuterRef, Prefetch, Subquery, Sum, When
+from django.db.models.functions import Coalesce
 from uuid import uuid4
+from .cache import bump_versions
+from .storage import image_storage
 from .validators import validate_file_size
 
 
@@ -14,13 +21,35 @@ class Promotion(models.Model):
     discount = models.FloatField()
 
 
+class CollectionQuerySet(models.QuerySet):
+    def recount_products(self):
+        # recompute products_count from scratch in one UPDATE
+        count = Product.objects \
+            .filter(collection=OuterRef('pk')) \
+            .order_by() \
+            .values('collection') \
+            .annotate(count=Count('id')) \
+            .values('count')
+        return self.update(
+            products_count=Coalesce(Subquery(count), 0))
+
+
 class Collection(models.Model):
+    objects = CollectionQuerySet.as_manager()
     title = models.CharField(max_length=255)
     # ↓ if parent(Collection) class defined before child(Product), use ''
     # related_name='+' tells Django not to create reverse relationship
     featured_product = models.ForeignKey(
         'Product', on_delete=models.SET_NULL, null=True, related_name='+', blank=True)
-    
+    # denormalized Count('products'), kept in sync by store.signals.handlers
+    # and ProductQuerySet, repaired with `manage.py reconcile_products_count`
+    products_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def update_products_count(self, delta):
+        Collection.objects \
+            .filter(pk=self.pk) \
+            .update(products_count=F('products_count') + delta)
+
     def __str__(self):
         return self.title
 
@@ -28,7 +57,118 @@ class Collection(models.Model):
         ordering = ['id']  # sort Collection by 'id'
 
 
+class ProductQuerySet(models.QuerySet):
+    # Bulk operations skip signals, so they recount the collections they
+    # touched and bump the cached payloads' versions themselves (again on
+    # commit, see bump_versions). Only search_vector writes change nothing
+    # a payload shows.
+    UNCACHED_FIELDS = {'search_vector'}
+
+    def update(self, **kwargs):
+        if set(kwargs) <= self.UNCACHED_FIELDS:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            old = list(self.order_by().values_list('id', 'collection_id'))
+            rows = super().update(**kwargs)
+            collection_ids = {collection_id for _, collection_id in old}
+            if 'collection' in kwargs or 'collection_id' in kwargs:
+                new = kwargs.get('collection', kwargs.get('collection_id'))
+                collection_ids.add(getattr(new, 'pk', new))
+                Collection.objects \
+                    .filter(pk__in=collection_ids) \
+                    .recount_products()
+            bump_versions(
+                product_ids=[product_id for product_id, _ in old],
+                collection_ids=collection_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            collection_ids = {obj.collection_id for obj in objs}
+            Collection.objects \
+                .filter(pk__in=collection_ids) \
+                .recount_products()
+            bump_versions(collection_ids=collection_ids)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if set(fields) <= self.UNCACHED_FIELDS:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            collection_ids = set(
+                Product.objects
+                .filter(pk__in=[obj.pk for obj in objs])
+                .order_by()
+                .values_list('collection_id', flat=True)
+                .distinct())
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            if 'collection' in fields or 'collection_id' in fields:
+                collection_ids |= {obj.collection_id for obj in objs}
+                Collection.objects \
+                    .filter(pk__in=collection_ids) \
+                    .recount_products()
+            bump_versions(
+                product_ids=[obj.pk for obj in objs],
+                collection_ids=collection_ids)
+        return rows
+
+    def recount_reviews(self):
+        # recompute reviews_count & last_review_date in one UPDATE
+        reviews = Review.objects \
+            .filter(product=OuterRef('pk')) \
+            .order_by() \
+            .values('product')
+        return self.update(
+            reviews_count=Coalesce(
+                Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+            last_review_date=Subquery(
+                reviews.annotate(latest=Max('date')).values('latest')))
+
+    def reserve(self, quantities):
+        # quantities = {product_id: quantity}, must run in a transaction.
+        # Rows are locked in id order, so concurrent checkouts of the
+        # same products queue up behind each other instead of deadlocking.
+        products = self \
+            .select_for_update() \
+            .filter(pk__in=quantities) \
+            .order_by('id') \
+            .only('id', 'title', 'inventory', 'unit_price', 'collection')
+        products = {product.id: product for product in products}
+
+        errors = {}
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                errors[str(product_id)] = ['Product is no longer available.']
+            elif product.inventory < quantity:
+                errors[str(product_id)] = [
+                    f'Only {product.inventory} left in stock.']
+        if errors:
+            raise ValidationError(errors)
+
+        # one UPDATE for all of them; the plain one, the versions
+        # are bumped below from the rows locked above
+        models.QuerySet.update(self.filter(pk__in=quantities), inventory=Case(
+            *[
+                When(pk=product_id, then=F('inventory') - quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            default=F('inventory')
+        ))
+        for product_id, quantity in quantities.items():
+            products[product_id].inventory -= quantity
+        bump_versions(
+            product_ids=products,
+            collection_ids=[product.collection_id for product in products.values()])
+        return products
+
+
 class Product(models.Model):
+    objects = ProductQuerySet.as_manager()
     title = models.CharField(max_length=255)
     # slug is uniquely identifying last part of URL
     slug = models.SlugField()
@@ -45,21 +185,54 @@ class Product(models.Model):
         Collection, on_delete=models.PROTECT, related_name='products')
     # ↓ Django creates reverse relationship btwn Promotion & Product
     promotions = models.ManyToManyField(Promotion, blank=True)
+    # title + collection title + description, kept up to date by
+    # store.signals.handlers, rebuilt with `manage.py update_search_vectors`
+    search_vector = SearchVectorField(null=True, editable=False)
+    # denormalized Count('reviews') & Max('reviews__date') for listings,
+    # kept in sync by store.signals.handlers, repaired with
+    # `manage.py reconcile_review_stats`
+    reviews_count = models.PositiveIntegerField(default=0, editable=False)
+    last_review_date = models.DateField(null=True, editable=False)
 
     def __str__(self):
         return self.title
     
     class Meta:
         ordering=['title']
+        # keyset pagination seeks on (ordering field, id)
+        indexes = [
+            models.Index(fields=['unit_price', 'id']),
+            models.Index(fields=['last_update', 'id']),
+            GinIndex(fields=['search_vector'], name='store_product_search_gin'),
+        ]
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name='product_images')
+    # files are stored once per content (store/storage.py)
     image = models.ImageField(
         upload_to='store/images',
+        storage=image_storage,
         validators=[validate_file_size]
     )
+    # smaller copies made by a celery task after upload (store.images),
+    # renditions_source is the `image` they were made from
+    thumbnail = models.ImageField(
+        upload_to='store/images/renditions', storage=image_storage, blank=True, editable=False)
+    thumbnail_webp = models.ImageField(
+        upload_to='store/images/renditions', storage=image_storage, blank=True, editable=False)
+    medium = models.ImageField(
+        upload_to='store/images/renditions', storage=image_storage, blank=True, editable=False)
+    medium_webp = models.ImageField(
+        upload_to='store/images/renditions', storage=image_storage, blank=True, editable=False)
+    renditions_source = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+
+    FILE_FIELDS = ['image', 'thumbnail', 'thumbnail_webp', 'medium', 'medium_webp']
+
+    @property
+    def renditions_ready(self):
+        return bool(self.image.name) and self.renditions_source == self.image.name
     # image = models.FileField(
     #     upload_to='store/images', 
     #     validators=[
@@ -110,7 +283,24 @@ class Customer(models.Model):
         ]
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        # everything OrderSerializer shows in 2 queries, however many
+        # orders & items: the orders, then their items joined to products
+        return self.prefetch_related(
+            Prefetch(
+                'items',
+                queryset=OrderItem.objects
+                    .select_related('product')
+                    .only('id', 'order', 'quantity', 'unit_price',
+                          'product', 'product__title', 'product__unit_price')
+                    .order_by('id')
+            )
+        )
+
+
 class Order(models.Model):
+    objects = OrderQuerySet.as_manager()
     PENDING_PAYMENT = 'P'
     COMPLETE_PAYMENT = 'C'
     FAILED_PAYMENT = 'F'
@@ -156,12 +346,64 @@ class Address(models.Model):
     # customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True)
 
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        # totals are computed by the database, items come with
+        # just the product columns SimpleProductSerializer needs
+        return self \
+            .annotate(total_price=Coalesce(
+                Sum(F('items__quantity') * F('items__product__unit_price')), 0,
+                output_field=models.DecimalField())) \
+            .prefetch_related(
+                Prefetch('items', queryset=CartItem.objects.with_totals()))
+
+
 class Cart(models.Model):
+    objects = CartQuerySet.as_manager()
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+class CartItemQuerySet(models.QuerySet):
+    def with_totals(self):
+        return self \
+            .select_related('product') \
+            .only('id', 'cart', 'quantity', 'product', 'product__title', 'product__unit_price') \
+            .annotate(total_price=F('quantity') * F('product__unit_price'))
+
+    def add(self, cart_id, product_id, quantity):
+        # INSERT ... ON CONFLICT DO UPDATE in one statement:
+        # no read-modify-write race, no IntegrityError on concurrent adds.
+        # INSERT ... SELECT inserts nothing (returns None) if the
+        # cart or product doesn't exist.
+        qn = connection.ops.quote_name
+        table = qn(CartItem._meta.db_table)
+        sql = f'''
+            INSERT INTO {table} (cart_id, product_id, quantity)
+            SELECT c.id, p.id, %s
+            FROM {qn(Cart._meta.db_table)} c, {qn(Product._meta.db_table)} p
+            WHERE c.id = %s AND p.id = %s
+            ON CONFLICT (cart_id, product_id)
+            DO UPDATE SET quantity = {table}.quantity + excluded.quantity
+            RETURNING id, quantity
+        '''
+        params = [
+            quantity,
+            Cart._meta.pk.get_db_prep_value(cart_id, connection),
+            product_id
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return CartItem(
+            id=row[0], cart_id=cart_id, product_id=product_id, quantity=row[1])
+
+
 class CartItem(models.Model):
+    objects = CartItemQuerySet.as_manager()
     cart = models.ForeignKey(
         Cart, on_delete=models.CASCADE, related_name='items')
     # if product deleted, it should be removed from all CartItems
@@ -180,3 +422,49 @@ class Review(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     date = models.DateField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # a product's reviews, newest first, seeked by ReviewPagination
+            models.Index(fields=['product', 'date', 'id'], name='store_review_product_date_idx'),
+        ]
+
+
+class Blob(models.Model):
+    # a file in the image storage and how many ProductImage
+    # fields point at it, see store/blobs.py
+    name = models.CharField(max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # delete_orphans() only looks at unreferenced blobs
+            models.Index(
+                fields=['updated_at'], condition=models.Q(refcount=0),
+                name='store_blob_orphans_idx')
+        ]
+
+
+class ImageUpload(models.Model):
+    # a ProductImage being uploaded in chunks, see store/uploads.py
+    id = models.UUIDField(primary_key=True, default=uuid4)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)  # sha256, hex
+    received = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class OutboxEvent(models.Model):
+    # written in the same transaction as the change it announces,
+    # delivered after commit by store.tasks.drain_outbox
+    topic = models.CharField(max_length=255)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # drains whose receivers raised, see store.outbox.MAX_ATTEMPTS
+    attempts = models.PositiveIntegerField(default=0)
+    # set instead of deleting an event nothing could deliver,
+    # clear it to have the event drained again
+    dead_lettered_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,126 @@
+import logging
+from functools import wraps
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from .models import Order, OutboxEvent
+from .signals import order_created
+
+
+# Transactional outbox: an event is a row written in the same
+# transaction as the change it announces, so it exists if and only if
+# that change was committed. After commit a Celery worker drains the
+# table (store.tasks.drain_outbox) and fires the actual signals, the
+# request never waits for the receivers.
+#
+# Delivery is at least once: receivers get the event's id as `event_id`
+# and have to cope with seeing it again, see idempotent().
+logger = logging.getLogger(__name__)
+
+ORDER_CREATED = 'order_created'
+# where & how long idempotent() remembers a handled event; the cache has
+# to be shared by the workers (check store.E002)
+HANDLED_CACHE = 'default'
+HANDLED_TIMEOUT = 60 * 60 * 24
+# drains an event gets when a receiver raises, then it's dead-lettered
+MAX_ATTEMPTS = 5
+
+
+def publish(topic, **payload):
+    OutboxEvent.objects.create(topic=topic, payload=payload)
+    # the beat schedule drains the outbox too,
+    # a lost kick only delays delivery
+    transaction.on_commit(kick, robust=True)
+
+
+def kick():
+    from .tasks import drain_outbox
+    drain_outbox.delay()
+
+
+def idempotent(receiver):
+    # For receivers with effects outside the database (mail, HTTP calls):
+    # their database writes roll back with a failed drain, those don't.
+    # The events a receiver handled are remembered in the (shared) cache
+    # and skipped when they're delivered again.
+    prefix = f'store:outbox:handled:{receiver.__module__}.{receiver.__qualname__}:'
+
+    @wraps(receiver)
+    def wrapper(sender, event_id, **kwargs):
+        cache = caches[HANDLED_CACHE]
+        key = prefix + str(event_id)
+        if cache.get(key):
+            return None
+        result = receiver(sender, event_id=event_id, **kwargs)
+        cache.set(key, True, HANDLED_TIMEOUT)
+        return result
+    return wrapper
+
+
+def dispatch_order_created(events):
+    # returns the ids of the events a receiver failed on
+    orders = Order.objects.in_bulk(
+        [event.payload['order_id'] for event in events])
+    failed = set()
+    for event in events:
+        order = orders.get(event.payload['order_id'])
+        if order is None:
+            continue
+        for receiver, error in order_created.send_robust(
+                Order, order=order, event_id=event.id):
+            if isinstance(error, Exception):
+                logger.error(
+                    'order_created receiver %r failed for order %s',
+                    receiver, order.id, exc_info=error)
+                failed.add(event.id)
+    return failed
+
+
+DISPATCHERS = {
+    ORDER_CREATED: dispatch_order_created,
+}
+
+
+def drain(batch_size=100):
+    # Events are locked while their receivers run and deleted in the
+    # same transaction, SKIP LOCKED keeps concurrent workers off each
+    # other's batches. A worker dying half way rolls back and the batch
+    # is delivered again, receivers included that had already run.
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(dead_lettered_at__isnull=True)
+            .order_by('id')[:batch_size])
+        if not events:
+            return 0
+
+        by_topic = {}
+        for event in events:
+            by_topic.setdefault(event.topic, []).append(event)
+        delivered, failed = [], set()
+        for topic, topic_events in by_topic.items():
+            dispatcher = DISPATCHERS.get(topic)
+            if dispatcher is None:
+                # kept for a release that knows the topic
+                logger.error('No dispatcher for outbox topic %r', topic)
+                OutboxEvent.objects \
+                    .filter(pk__in=[event.id for event in topic_events]) \
+                    .update(dead_lettered_at=timezone.now())
+                continue
+            topic_failed = dispatcher(topic_events)
+            failed |= topic_failed
+            delivered += [event for event in topic_events if event.id not in topic_failed]
+
+        OutboxEvent.objects \
+            .filter(pk__in=[event.id for event in delivered]) \
+            .delete()
+        # a receiver raised: delivered again by a later drain (idempotent
+        # receivers skip it), until MAX_ATTEMPTS
+        OutboxEvent.objects.filter(pk__in=failed).update(
+            attempts=F('attempts') + 1,
+            dead_lettered_at=Case(
+                When(attempts__gte=MAX_ATTEMPTS - 1, then=timezone.now()),
+                default=None))
+    return len(events)
@@ -1,5 +1,155 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    # ?pagination=cursor&ordering=-unit_price
+    # seeks with WHERE (field, id) > (last_field, last_id)
+    # instead of COUNT(*) + OFFSET, so every page costs the same
+    page_size = 10
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    ordering_fields = ['id']
+    default_ordering = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field, self.descending = self.get_ordering(request, view)
+        self.model_field = queryset.model._meta.get_field(self.field)
+        value, pk, reverse = self.decode_cursor(request)
+
+        # reverse=True walks backwards to build the previous page
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(prefix + self.field, prefix + 'id')
+
+        if pk is not None:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value})
+                | Q(**{self.field: value, f'id__{lookup}': pk})
+            )
+
+        # one extra row tells us if there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        if reverse:
+            self.has_next, self.has_previous = pk is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, pk is not None
+        return results
+
+    def get_ordering(self, request, view):
+        fields = getattr(view, 'ordering_fields', self.ordering_fields)
+        # only the first ordering term drives the seek,
+        # ties are always broken by id
+        param = request.query_params.get(self.ordering_param, '')
+        term = param.split(',')[0].strip()
+        field = term.lstrip('-')
+        if field not in fields:
+            return self.default_ordering.lstrip('-'), self.default_ordering.startswith('-')
+        return field, term.startswith('-')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None, False
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode()))
+            value = self.model_field.to_python(data['v'])
+            return value, int(data['id']), bool(data['r'])
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            # to_python() raises ValidationError for a bad value
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        data = {
+            'v': self.model_field.value_to_string(obj),
+            'id': obj.pk,
+            'r': reverse
+        }
+        encoded = urlsafe_b64encode(json.dumps(data).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        # no 'count' on purpose, counting is what we're avoiding
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ReviewPagination(KeysetPagination):
+    # newest first, seeks on the (product_id, date, id) index
+    ordering_fields = ['date']
+    default_ordering = '-date'
+
+
+class ProductPagination(BasePagination):
+    # page numbers by default so existing clients keep working,
+    # ?pagination=cursor switches to keyset pagination
+    mode_query_param = 'pagination'
+
+    @property
+    def display_page_controls(self):
+        paginator = getattr(self, 'paginator', None)
+        return getattr(paginator, 'display_page_controls', False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.paginator = KeysetPagination()
+        else:
+            self.paginator = DefaultPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return DefaultPagination().get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_results(self, data):
+        return self.paginator.get_results(data)
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from random import choice
+from time import monotonic, time
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+
+# Read replicas for the catalog. ReplicaMiddleware lets safe
+# (GET/HEAD/OPTIONS) requests use a replica and ReplicaRouter sends
+# reads of the catalog models to one that isn't lagging; everything
+# else, and anything outside a request (celery, management commands),
+# stays on the primary.
+#
+# Read-your-writes: after a client writes, a cookie keeps its requests
+# on the primary for PIN_SECONDS, longer than replication normally lags.
+#
+# Whatever is cached under the current version counters has to be read
+# inside primary(): a write bumps the counters right away, and a replica
+# up to MAX_LAG behind could still hand back the rows from before it,
+# which would then be cached as the new version.
+CATALOG_MODELS = {'collection', 'product', 'productimage', 'promotion', 'review'}
+PIN_COOKIE = 'db_primary_until'
+LAG_CHECK_INTERVAL = 1  # seconds between lag checks of a replica
+
+_reads = ContextVar('replica_reads', default=None)
+_lag_cache = {}
+
+
+def get_config():
+    return {
+        'ALIASES': [],
+        'MAX_LAG': 2,
+        'PIN_SECONDS': 5,
+        **getattr(settings, 'STORE_REPLICAS', {})
+    }
+
+
+def replica_lag(alias):
+    # seconds the replica is behind, cached for LAG_CHECK_INTERVAL
+    now = monotonic()
+    cached = _lag_cache.get(alias)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    lag = 0.0
+    connection = connections[alias]
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                # caught up (or not a standby at all) counts as no lag,
+                # an idle primary would otherwise look like it's lagging
+                cursor.execute('''
+                    SELECT CASE
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                    END
+                ''')
+                lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError:
+            # unreachable counts as too far behind
+            lag = float('inf')
+    _lag_cache[alias] = (now + LAG_CHECK_INTERVAL, lag)
+    return lag
+
+
+def clear_lag_cache():
+    _lag_cache.clear()
+
+
+def pick_replica(config):
+    healthy = [
+        alias for alias in config['ALIASES']
+        if replica_lag(alias) <= config['MAX_LAG']
+    ]
+    return choice(healthy) if healthy else None
+
+
+@contextmanager
+def primary():
+    # catalog reads in the block go to the primary
+    token = _reads.set(None)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        if not config['ALIASES']:
+            return self.get_response(request)
+
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE) or 0) > time()
+        except ValueError:
+            pinned = False
+        reads = None
+        if request.method in ('GET', 'HEAD', 'OPTIONS') and not pinned:
+            # the replica is picked on the first catalog read,
+            # requests that never read the catalog skip the lag check
+            reads = {'config': config}
+
+        token = _reads.set(reads)
+        try:
+            response = self.get_response(request)
+        finally:
+            _reads.reset(token)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                PIN_COOKIE, str(time() + config['PIN_SECONDS']),
+                max_age=config['PIN_SECONDS'], httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        reads = _reads.get()
+        if reads is None or model._meta.app_label != 'store' \
+                or model._meta.model_name not in CATALOG_MODELS:
+            return None
+        if 'alias' not in reads:
+            reads['alias'] = pick_replica(reads['config'])
+        return reads['alias']
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        return db not in get_config()['ALIASES']
@@ -0,0 +1,45 @@
+import re
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from .models import Collection, Product
+
+
+SEARCH_CONFIG = 'english'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def product_search_vector():
+    # title matches rank above collection title, above description
+    collection_title = Subquery(
+        Collection.objects
+        .filter(pk=OuterRef('collection_id'))
+        .values('title')[:1]
+    )
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(collection_title, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset=None):
+    # update() doesn't send signals or touch last_update
+    if not is_supported():
+        return 0
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.update(search_vector=product_search_vector())
+
+
+def build_search_query(terms):
+    # every term is a prefix match so 'lapt' still finds 'laptop',
+    # like the old ILIKE '%term%' did for word beginnings
+    words = re.findall(r'\w+', ' '.join(terms))
+    if not words:
+        return None
+    raw = ' & '.join(f"'{word}':*" for word in words)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
@@ -1,10 +1,15 @@
 # store/serializers.py
+import re
 from decimal import Decimal
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from django.db.models import Count
 from rest_framework import serializers
-from .signals import order_created
-from .models import OrderItem, Product, Collection, Review, Cart, CartItem, Customer, Order, ProductImage
+from rest_framework.exceptions import NotFound
+from . import carts, outbox, uploads
+from .images import RENDITIONS
+from .validators import MAX_FILE_SIZE_KB
+from .models import OrderItem, Product, Collection, Review, Cart, CartItem, Customer, Order, ProductImage, ImageUpload
 
 
 # pylint: disable=no-member
@@ -23,9 +28,46 @@ class ProductImageSerializer(serializers.ModelSerializer):
         return ProductImage.objects.create(
             product_id=product_id, **validated_data)
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if not instance.renditions_ready:
+            # still being generated (or left from a replaced image),
+            # clients fall back to `image`
+            for field in RENDITIONS:
+                data[field] = None
+        return data
+
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        # renditions aren't editable, so they're read-only
+        fields = ['id', 'image', *RENDITIONS]
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+    chunk_size = serializers.SerializerMethodField()
+
+    def get_chunk_size(self, upload):
+        return uploads.get_config()['CHUNK_SIZE']
+
+    def validate_size(self, size):
+        # refused before a single byte of the file is sent
+        if size > MAX_FILE_SIZE_KB * 1024:
+            raise serializers.ValidationError(
+                f'File size cannot be larger than {MAX_FILE_SIZE_KB} KB!')
+        return size
+
+    def validate_checksum(self, checksum):
+        if not re.fullmatch(r'[0-9a-f]{64}', checksum):
+            raise serializers.ValidationError('Expected a hex encoded sha256.')
+        return checksum
+
+    def create(self, validated_data):
+        return uploads.start(self.context['product_id'], **validated_data)
+
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'filename', 'size', 'checksum', 'offset', 'chunk_size']
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -35,8 +77,10 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         # by default ModelSerializer uses PrimaryKeyRelatedField
+        # reviews_count & last_review_date are stored on the product, no extra query
         fields = [
-            'id', 'title', 'description', 'slug', 'inventory', 'price', 'price_with_tax', 'collection', 'images']
+            'id', 'title', 'description', 'slug', 'inventory', 'price', 'price_with_tax', 'collection', 'images',
+            'reviews_count', 'last_review_date']
         # don't do the following way!
         # fields = '__all__'
     price = serializers.DecimalField(
@@ -82,10 +126,9 @@ class SimpleProductSerializer(serializers.ModelSerializer):
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = SimpleProductSerializer(read_only=True)
-    total_price = serializers.SerializerMethodField()
-
-    def get_total_price(self, cart_item: CartItem):
-        return cart_item.quantity * cart_item.product.unit_price
+    # annotated by CartItem.objects.with_totals() (or the cart store)
+    total_price = serializers.DecimalField(
+        max_digits=None, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
@@ -95,13 +138,12 @@ class CartItemSerializer(serializers.ModelSerializer):
 class CartSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField()
+    # annotated by Cart.objects.with_totals() (or the cart store)
+    total_price = serializers.DecimalField(
+        max_digits=None, decimal_places=2, read_only=True)
 
-    def get_total_price(self, cart: Cart):
-        return sum(
-            [item.quantity * item.product.unit_price 
-             for item in cart.items.all()]
-        )
+    def create(self, validated_data):
+        return carts.cart_store.create()
 
     class Meta:
         model = Cart
@@ -110,24 +152,20 @@ class CartSerializer(serializers.ModelSerializer):
 
 class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
-    
-    def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
-            raise serializers.ValidationError('No product with the given ID was found')
-        return value
-    
+
     def save(self, **kwargs):
         cart_id = self.context['cart_id']
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
 
         try:
-            cart_item = CartItem.objects.get(cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(cart_id=cart_id, **self.validated_data)
+            self.instance = carts.cart_store.add_item(
+                cart_id, product_id, quantity)
+        except Cart.DoesNotExist:
+            raise NotFound('No cart with the given ID was found.')
+        except Product.DoesNotExist:
+            raise serializers.ValidationError(
+                {'product_id': ['No product with the given ID was found']})
 
         return self.instance
     
@@ -137,6 +175,10 @@ class AddCartItemSerializer(serializers.ModelSerializer):
 
 
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        return carts.cart_store.update_item(
+            instance, validated_data['quantity'])
+
     class Meta:
         model = CartItem
         fields = ['quantity']
@@ -176,44 +218,60 @@ class UpdateOrderSerializer(serializers.ModelSerializer):
 class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
-    def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
-            raise serializers.ValidationError('No cart with the given ID was found.')
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
-            raise serializers.ValidationError('The card is empty.')
-        return cart_id
-
+    # Checkout is one transaction, validation included, and takes
+    # a fixed number of queries however big the cart is:
+    # cart items (locked) 1, customer 1, inventory lock + update 2,
+    # order 1, order items 1, SQL cart delete 3, outbox event 1
+    # = 10 with DatabaseCartStore (7 with a key-value cart store),
+    # 12 round trips with BEGIN/COMMIT.
+    # The response is built from these rows, it needs no more queries.
     def save(self, **kwargs):
-        with transaction.atomic():
-            cart_id = self.validated_data['cart_id']
-            
-            customer = Customer.objects.get(
-                user_id=self.context['user_id'])
-            
-            order = Order.objects.create(customer=customer)
-
-            # field definitions are stored in 'self.validated_data'
-            cart_items = (
-                CartItem.objects
-                .select_related('product')
-                .filter(cart_id=cart_id)
-            )
-            
-            order_items = [
-                OrderItem(
-                    order=order, 
-                    product=item.product,
-                    unit_price=item.product.unit_price,
-                    quantity=item.quantity
-                ) for item in cart_items
-            ]
-            OrderItem.objects.bulk_create(order_items)
-
-            Cart.objects.filter(pk=cart_id).delete()
-
-            # with 'send' if any receiver fails, 
-            # other receivers not notified
-            order_created.send_robust(
-                self.__class__, order=order)
-
-            return order
+        cart_id = self.validated_data['cart_id']
+        claimed = False
+        try:
+            with transaction.atomic():
+                quantities = carts.cart_store.checkout_items(cart_id)
+                if quantities is None:
+                    raise serializers.ValidationError(
+                        {'cart_id': ['No cart with the given ID was found.']})
+                claimed = True
+                if not quantities:
+                    raise serializers.ValidationError(
+                        {'cart_id': ['The card is empty.']})
+
+                customer_id = Customer.objects \
+                    .values_list('id', flat=True) \
+                    .get(user_id=self.context['user_id'])
+
+                try:
+                    products = Product.objects.reserve(quantities)
+                except DjangoValidationError as error:
+                    raise serializers.ValidationError(
+                        {'items': error.message_dict})
+
+                order = Order.objects.create(customer_id=customer_id)
+
+                # prices come from the locked rows, not from the cart
+                order_items = [
+                    OrderItem(
+                        order=order, 
+                        product=products[product_id],
+                        unit_price=products[product_id].unit_price,
+                        quantity=quantity
+                    ) for product_id, quantity in quantities.items()
+                ]
+                OrderItem.objects.bulk_create(order_items)
+                # OrderSerializer reads these instead of querying them back
+                order._prefetched_objects_cache = {'items': order_items}
+
+                carts.cart_store.delete_on_commit(cart_id)
+
+                # receivers run in a worker once this commits
+                outbox.publish(outbox.ORDER_CREATED, order_id=order.id)
+
+                return order
+        except BaseException:
+            if claimed:
+                # nothing was ordered, the cart can be checked out again
+                carts.cart_store.release_checkout(cart_id)
+            raise
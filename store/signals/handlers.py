@@ -1,10 +1,157 @@
+from collections import Counter
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.dispatch import receiver
-from ..models import Customer
+from .. import blobs
+from ..cache import bump_versions
+from ..search import update_search_vectors
+from ..tasks import generate_image_renditions
+from ..models import Customer, Product, ProductImage, Collection, Review
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
     if kwargs['created']:
         Customer.objects.create(user=kwargs['instance'])
+
+
+@receiver(pre_save, sender=Product)
+def remember_old_collection(sender, instance, **kwargs):
+    # product may be moving to another collection,
+    # both collections' cached pages need invalidating
+    instance._old_collection_id = None
+    if instance.pk is not None:
+        instance._old_collection_id = (
+            Product.objects
+            .filter(pk=instance.pk)
+            .values_list('collection_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def update_products_count(sender, instance, created, **kwargs):
+    old_collection_id = getattr(instance, '_old_collection_id', None)
+    if created or old_collection_id != instance.collection_id:
+        if old_collection_id is not None:
+            Collection(pk=old_collection_id).update_products_count(-1)
+        Collection(pk=instance.collection_id).update_products_count(1)
+
+
+@receiver(post_delete, sender=Product)
+def decrease_products_count(sender, instance, **kwargs):
+    Collection(pk=instance.collection_id).update_products_count(-1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    bump_versions(
+        product_ids=[instance.pk],
+        collection_ids=[
+            instance.collection_id,
+            getattr(instance, '_old_collection_id', None)
+        ]
+    )
+
+
+def invalidate_product_id(product_id):
+    collection_id = (
+        Product.objects
+        .filter(pk=product_id)
+        .values_list('collection_id', flat=True)
+        .first()
+    )
+    bump_versions(
+        product_ids=[product_id],
+        collection_ids=[collection_id]
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_product_image(sender, instance, **kwargs):
+    invalidate_product_id(instance.product_id)
+
+
+@receiver(post_save, sender=Review)
+def add_to_review_stats(sender, instance, created, **kwargs):
+    if created:
+        date = Value(instance.date)
+        Product.objects.filter(pk=instance.product_id).update(
+            reviews_count=F('reviews_count') + 1,
+            last_review_date=Greatest(Coalesce('last_review_date', date), date))
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_review_stats(sender, instance, **kwargs):
+    # the latest date may be gone, so recount
+    Product.objects.filter(pk=instance.product_id).recount_reviews()
+
+
+@receiver(pre_save, sender=ProductImage)
+def remember_old_files(sender, instance, **kwargs):
+    instance._old_files = []
+    if instance.pk is not None:
+        instance._old_files = list(
+            ProductImage.objects
+            .filter(pk=instance.pk)
+            .values_list(*ProductImage.FILE_FIELDS)
+            .first() or []
+        )
+
+
+@receiver(post_save, sender=ProductImage)
+def count_file_references(sender, instance, **kwargs):
+    # files are shared between images (store/storage.py),
+    # count the references each one gained or lost
+    new = Counter(getattr(instance, field).name for field in ProductImage.FILE_FIELDS)
+    old = Counter(getattr(instance, '_old_files', []))
+    blobs.retain((new - old).elements())
+    blobs.release((old - new).elements())
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_files(sender, instance, **kwargs):
+    blobs.release(getattr(instance, field).name for field in ProductImage.FILE_FIELDS)
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_renditions(sender, instance, **kwargs):
+    # new or replaced image, the task's own save finds them ready
+    if instance.image.name and not instance.renditions_ready:
+        transaction.on_commit(
+            lambda: generate_image_renditions.delay(instance.pk), robust=True)
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def invalidate_collection(sender, instance, **kwargs):
+    bump_versions(collection_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, **kwargs):
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_save, sender=Collection)
+def remember_old_title(sender, instance, **kwargs):
+    instance._old_title = None
+    if instance.pk is not None:
+        instance._old_title = (
+            Collection.objects
+            .filter(pk=instance.pk)
+            .values_list('title', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Collection)
+def update_collection_search_vectors(sender, instance, created, **kwargs):
+    # collection title is part of every product's search vector
+    if not created and instance.title != instance._old_title:
+        update_search_vectors(Product.objects.filter(collection=instance))
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import posixpath
+from tempfile import mkstemp
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.deconstruct import deconstructible
+
+
+# Product images are stored once per content: a file is saved under the
+# sha256 of its bytes, so the same vendor photo uploaded for 50 products
+# takes the disk space of one. See store/blobs.py for deleting them.
+#
+# Files are written in temp_dir and renamed into place, the media root
+# (served by nginx or core.media) never holds a half-written file.
+# temp_dir has to be on the media root's filesystem for the rename to be
+# atomic; it defaults to FILE_UPLOAD_TEMP_DIR, or .cas-tmp next to the
+# media root.
+READ_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, temp_dir=None, **kwargs):
+        super().__init__(**kwargs)
+        self._temp_dir = temp_dir
+
+    @property
+    def temp_dir(self):
+        return self._temp_dir or settings.FILE_UPLOAD_TEMP_DIR or os.path.join(
+            os.path.dirname(os.path.abspath(self.location)), '.cas-tmp')
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        if hasattr(content, 'temporary_file_path'):
+            # already on disk (large or chunked uploads), hash it and
+            # move it into place below
+            temporary_path = content.temporary_file_path()
+            with open(temporary_path, 'rb') as file:
+                while data := file.read(READ_SIZE):
+                    sha256.update(data)
+        else:
+            # hashed while it's written, the content is read once
+            fd, temporary_path = mkstemp(dir=self.temp_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    sha256.update(chunk)
+                    file.write(chunk)
+
+        digest = sha256.hexdigest()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        path = self.path(name)
+        if os.path.exists(path):
+            # keep blobs.delete_orphans() off the file, and if it was
+            # deleting it just now, write it again below
+            from . import blobs
+            blobs.touch(name)
+            if os.path.exists(path):
+                # stored already, nothing to write
+                if not hasattr(content, 'temporary_file_path'):
+                    os.remove(temporary_path)
+                return name
+
+        if not hasattr(content, 'temporary_file_path'):
+            staged_path = temporary_path
+        else:
+            # the upload may be on another filesystem, where moving
+            # it is a copy; that copy goes to temp_dir as well
+            fd, staged_path = mkstemp(dir=self.temp_dir, suffix='.tmp')
+            os.close(fd)
+            file_move_safe(temporary_path, staged_path, allow_overwrite=True)
+        os.chmod(staged_path, self.file_permissions_mode or 0o644)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # a concurrent upload of the same content just
+        # replaces the file with identical bytes
+        os.replace(staged_path, path)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # _save() picks the final name
+        return name
+
+
+def image_storage():
+    return storages['images']
@@ -0,0 +1,43 @@
+import logging
+from celery import shared_task
+from PIL import Image
+from . import blobs, images, outbox, uploads
+from .models import ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def drain_outbox(batch_size=100):
+    drained = outbox.drain(batch_size)
+    # a full batch means there may be more waiting
+    if drained == batch_size:
+        drain_outbox.delay(batch_size)
+    return drained
+
+
+@shared_task
+def generate_image_renditions(image_id):
+    product_image = ProductImage.objects.filter(pk=image_id).first()
+    # deleted, or already done by an earlier run of the task
+    if product_image is None or product_image.renditions_ready:
+        return
+    try:
+        images.generate_renditions(product_image)
+    except (OSError, Image.DecompressionBombError):
+        # not an image Pillow can read, retrying won't change that;
+        # the serializer and admin keep using the original
+        logger.exception('Cannot generate renditions of image %s', image_id)
+
+
+@shared_task
+def delete_stale_uploads():
+    # chunked uploads that were abandoned before finalize
+    return uploads.delete_stale()
+
+
+@shared_task
+def delete_orphaned_blobs():
+    # image files no ProductImage points at anymore
+    return blobs.delete_orphans()
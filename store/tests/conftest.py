@@ -15,3 +15,4 @@ def authenticate(api_client):
         return api_client.force_authenticate(
             user=User(is_staff=is_staff))
     return do_authenticate
+
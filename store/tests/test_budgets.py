@@ -0,0 +1,160 @@
+import json
+import math
+import pytest
+from io import StringIO
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from store import carts
+from store.cache import product_cache
+from store.models import Collection, Customer, Order, Product
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+# Query count & latency budgets for every endpoint, against a dataset
+# seeded once per run with `generate_data`. A change that adds queries
+# or blows the latency envelope fails here.
+#   pytest store/tests/test_budgets.py --budget-scale 10 --budget-report budgets.json
+#   pytest store/tests/test_budgets.py --update-budgets  (after an intended change)
+BUDGETS_FILE = Path(__file__).with_name('budgets.json')
+REPEATS = 5
+
+# name: (who's asking, url)
+ENDPOINTS = {
+    'products-list': lambda d: ('anonymous', '/store/products/'),
+    'products-list-collection': lambda d: ('anonymous', f'/store/products/?collection_id={d.collection_id}'),
+    'products-list-cursor': lambda d: ('anonymous', '/store/products/?pagination=cursor&ordering=unit_price'),
+    'products-search': lambda d: ('anonymous', '/store/products/?search=organic'),
+    'product-detail': lambda d: ('anonymous', f'/store/products/{d.product_id}/'),
+    'product-reviews': lambda d: ('anonymous', f'/store/products/{d.product_id}/reviews/'),
+    'product-images': lambda d: ('anonymous', f'/store/products/{d.product_id}/images/'),
+    'collections-list': lambda d: ('anonymous', '/store/collections/'),
+    'cart-detail': lambda d: ('anonymous', f'/store/carts/{d.cart_id}/'),
+    'cart-items': lambda d: ('anonymous', f'/store/carts/{d.cart_id}/items/'),
+    'customers-me': lambda d: ('customer', '/store/customers/me/'),
+    'customers-list': lambda d: ('staff', '/store/customers/'),
+    'orders-list': lambda d: ('customer', '/store/orders/'),
+    'orders-list-staff': lambda d: ('staff', '/store/orders/'),
+    'order-detail': lambda d: ('staff', f'/store/orders/{d.order_id}/'),
+    'admin-products': lambda d: ('admin', '/admin/store/product/'),
+    'admin-collections': lambda d: ('admin', '/admin/store/collection/'),
+    'admin-customers': lambda d: ('admin', '/admin/store/customer/'),
+    'admin-orders': lambda d: ('admin', '/admin/store/order/'),
+}
+
+
+class Dataset:
+    pass
+
+
+@pytest.fixture(scope='module')
+def dataset(request, django_db_setup, django_db_blocker):
+    scale = request.config.getoption('budget_scale')
+    with django_db_blocker.unblock():
+        call_command(
+            'generate_data', collections=10, products=200 * scale,
+            customers=20 * scale, orders=100 * scale, stdout=StringIO())
+
+        data = Dataset()
+        data.scale = scale
+        data.collection_id = Collection.objects.order_by('-products_count').first().id
+        data.product_id = Product.objects.order_by('id').first().id
+        order = Order.objects.order_by('id').first()
+        data.order_id = order.id
+        data.customer_user = Customer.objects.get(pk=order.customer_id).user
+        data.admin_user = get_user_model().objects.create_superuser(
+            'budget-admin', 'budget-admin@example.com', 'x')
+        cart = carts.cart_store.create()
+        for product in Product.objects.order_by('id')[:20]:
+            carts.cart_store.add_item(cart.id, product.id, 1)
+        data.cart_id = cart.id
+
+        yield data
+
+        # the data was committed outside of any test transaction
+        call_command('flush', interactive=False, verbosity=0)
+
+
+@pytest.fixture(scope='session')
+def budget_results(request):
+    results = {}
+    yield results
+
+    config = request.config
+    if config.getoption('update_budgets') and results:
+        budgets = json.loads(BUDGETS_FILE.read_text()) if BUDGETS_FILE.exists() else {}
+        for name, result in results.items():
+            budgets[name] = {
+                'queries': result['queries'],
+                # generous, timings vary a lot between machines
+                'ms': max(50, math.ceil(result['median_ms'] * 3 / 10) * 10)
+            }
+        BUDGETS_FILE.write_text(json.dumps(budgets, indent=2, sort_keys=True) + '\n')
+
+    report_file = config.getoption('budget_report')
+    if report_file:
+        Path(report_file).write_text(json.dumps({
+            'scale': config.getoption('budget_scale'),
+            'repeats': REPEATS,
+            'endpoints': results
+        }, indent=2))
+
+
+def client_for(who, data):
+    client = APIClient()
+    if who == 'customer':
+        client.force_authenticate(user=data.customer_user)
+    elif who == 'staff':
+        client.force_authenticate(user=data.admin_user)
+    elif who == 'admin':
+        client.force_login(data.admin_user)
+    return client
+
+
+def measure(client, url):
+    # first call warms up url resolving, templates etc.
+    client.get(url)
+    queries = 0
+    timings = []
+    for _ in range(REPEATS):
+        # measure the database, not the product cache
+        product_cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            response = client.get(url)
+            timings.append((perf_counter() - start) * 1000)
+        queries = max(queries, len(context))
+    return response, queries, timings
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', ENDPOINTS)
+def test_if_endpoint_is_called_it_stays_within_budget(name, dataset, budget_results, request):
+    who, url = ENDPOINTS[name](dataset)
+
+    response, queries, timings = measure(client_for(who, dataset), url)
+
+    assert response.status_code == status.HTTP_200_OK
+    budget = json.loads(BUDGETS_FILE.read_text()).get(name) if BUDGETS_FILE.exists() else None
+    result = {
+        'url': url,
+        'queries': queries,
+        'median_ms': round(median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'budget': budget,
+    }
+    budget_results[name] = result
+    if request.config.getoption('update_budgets'):
+        return
+
+    assert budget is not None, f'No budget for {name}, run with --update-budgets'
+    result['passed'] = queries <= budget['queries'] and result['median_ms'] <= budget['ms']
+    assert queries <= budget['queries'], \
+        f'{name} takes {queries} queries, budget is {budget["queries"]}'
+    assert result['median_ms'] <= budget['ms'], \
+        f'{name} takes {result["median_ms"]}ms, budget is {budget["ms"]}ms'
@@ -0,0 +1,223 @@
+import pytest
+from threading import Barrier, Thread
+from django.conf import settings
+from django.db import connection
+from store import carts
+from store.models import Order, Product
+from rest_framework import status
+from rest_framework.test import APIClient
+from model_bakery import baker
+
+
+# every test runs against the SQL carts and the key-value carts
+@pytest.fixture(autouse=True, params=['database', 'key-value'])
+def cart_store(request, monkeypatch):
+    if request.param == 'database':
+        store = carts.DatabaseCartStore()
+    else:
+        store = carts.LocalCartStore()
+    monkeypatch.setattr(carts, 'cart_store', store)
+    return store
+
+
+@pytest.fixture
+def add_item(api_client):
+    def do_add_item(cart_id, product_id, quantity=1):
+        return api_client.post(
+            f'/store/carts/{cart_id}/items/',
+            {'product_id': product_id, 'quantity': quantity})
+    return do_add_item
+
+
+@pytest.mark.django_db
+class TestAddCartItem:
+    def test_if_item_is_added_it_takes_one_query(self, add_item, cart_store, django_assert_num_queries):
+        cart = cart_store.create()
+        product = baker.make(Product)
+
+        with django_assert_num_queries(1):
+            response = add_item(cart.id, product.id, 2)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['quantity'] == 2
+
+
+    def test_if_item_is_added_twice_quantities_are_summed(self, add_item, cart_store):
+        cart = cart_store.create()
+        product = baker.make(Product)
+
+        add_item(cart.id, product.id, 2)
+        response = add_item(cart.id, product.id, 3)
+
+        assert response.data['quantity'] == 5
+        assert cart_store.get_items(cart.id)[0].quantity == 5
+
+
+    def test_if_product_does_not_exist_returns_400(self, add_item, cart_store):
+        cart = cart_store.create()
+
+        response = add_item(cart.id, 0)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['product_id'] is not None
+
+
+    def test_if_cart_does_not_exist_returns_404(self, add_item):
+        product = baker.make(Product)
+
+        response = add_item('00000000-0000-0000-0000-000000000000', product.id)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+
+@pytest.mark.django_db
+class TestCartContract:
+    def test_if_cart_is_created_returns_empty_cart(self, api_client):
+        response = api_client.post('/store/carts/')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['items'] == []
+        assert response.data['total_price'] == 0
+
+
+    def test_if_cart_has_items_returns_them_with_totals(self, api_client, add_item):
+        cart_id = api_client.post('/store/carts/').data['id']
+        product = baker.make(Product, unit_price=2)
+        add_item(cart_id, product.id, 3)
+
+        response = api_client.get(f'/store/carts/{cart_id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        [item] = response.data['items']
+        assert item['product'] == {'id': product.id, 'title': product.title, 'unit_price': 2}
+        assert item['quantity'] == 3
+        assert response.data['total_price'] == 6
+
+
+    def test_if_cart_is_large_it_is_retrieved_in_constant_queries(self, api_client, cart_store, django_assert_max_num_queries):
+        cart = cart_store.create()
+        for product in baker.make(Product, unit_price=1.5, _quantity=200):
+            cart_store.add_item(cart.id, product.id, 2)
+
+        with django_assert_max_num_queries(2):
+            response = api_client.get(f'/store/carts/{cart.id}/')
+
+        assert len(response.data['items']) == 200
+        assert response.data['items'][0]['total_price'] == 3
+        assert response.data['total_price'] == 600
+
+
+    def test_if_item_is_patched_and_deleted_cart_follows(self, api_client, add_item):
+        cart_id = api_client.post('/store/carts/').data['id']
+        item_id = add_item(cart_id, baker.make(Product).id).data['id']
+
+        response = api_client.patch(
+            f'/store/carts/{cart_id}/items/{item_id}/', {'quantity': 4})
+        assert response.data == {'quantity': 4}
+        assert api_client.get(f'/store/carts/{cart_id}/items/{item_id}/').data['quantity'] == 4
+
+        response = api_client.delete(f'/store/carts/{cart_id}/items/{item_id}/')
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert api_client.get(f'/store/carts/{cart_id}/items/').data == []
+
+
+    def test_if_cart_is_deleted_it_is_gone(self, api_client):
+        cart_id = api_client.post('/store/carts/').data['id']
+
+        response = api_client.delete(f'/store/carts/{cart_id}/')
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert api_client.get(f'/store/carts/{cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_cart_is_checked_out_items_become_order_items(self, api_client, add_item, django_capture_on_commit_callbacks):
+        cart_id = api_client.post('/store/carts/').data['id']
+        product = baker.make(Product, unit_price=5, inventory=10)
+        add_item(cart_id, product.id, 2)
+        user = baker.make(settings.AUTH_USER_MODEL)
+        api_client.force_authenticate(user=user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post('/store/orders/', {'cart_id': cart_id})
+
+        order = Order.objects.get(pk=response.data['id'])
+        assert [(i.product_id, i.quantity, i.unit_price) for i in order.items.all()] == [(product.id, 2, 5)]
+        assert api_client.get(f'/store/carts/{cart_id}/').status_code == status.HTTP_404_NOT_FOUND
+
+    def test_if_checkout_is_rolled_back_cart_can_be_checked_out_again(self, api_client, add_item):
+        cart_id = api_client.post('/store/carts/').data['id']
+        product = baker.make(Product, inventory=1)
+        add_item(cart_id, product.id, 2)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        response = api_client.post('/store/orders/', {'cart_id': cart_id})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        Product.objects.filter(pk=product.id).update(inventory=2)
+        response = api_client.post('/store/orders/', {'cart_id': cart_id})
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentCheckout:
+    def test_if_cart_is_checked_out_concurrently_one_order_is_placed(self, cart_store):
+        cart = cart_store.create()
+        product = baker.make(Product, inventory=100)
+        cart_store.add_item(cart.id, product.id, 1)
+        threads_count = 8
+        users = baker.make(settings.AUTH_USER_MODEL, _quantity=threads_count)
+        barrier = Barrier(threads_count)
+        statuses = []
+
+        def checkout(user):
+            try:
+                client = APIClient()
+                client.force_authenticate(user=user)
+                barrier.wait()
+                response = client.post('/store/orders/', {'cart_id': cart.id})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=checkout, args=[user]) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(statuses) == [status.HTTP_200_OK] + [status.HTTP_400_BAD_REQUEST] * (threads_count - 1)
+        assert Order.objects.count() == 1
+        assert Product.objects.get(pk=product.id).inventory == 99
+
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentAddCartItem:
+    def test_if_items_are_added_concurrently_no_update_is_lost(self, cart_store):
+        cart = cart_store.create()
+        product = baker.make(Product)
+        threads_count = 8
+        barrier = Barrier(threads_count)
+        statuses = []
+
+        def add():
+            try:
+                client = APIClient()
+                barrier.wait()
+                response = client.post(
+                    f'/store/carts/{cart.id}/items/',
+                    {'product_id': product.id, 'quantity': 1})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=add) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert statuses == [status.HTTP_201_CREATED] * threads_count
+        assert cart_store.get_items(cart.id)[0].quantity == threads_count
@@ -1,5 +1,7 @@
 # store/tests/test_collections.py
 import pytest
+from io import StringIO
+from django.core.management import call_command
 from store.models import Collection, Product
 from rest_framework import status
 from model_bakery import baker
@@ -76,3 +78,98 @@ class TestRetrieveCollection:
             'title': collection.title,
             'products_count': 0
         }
+
+
+
+@pytest.mark.django_db
+class TestCollectionsConditionalGet:
+    def test_if_collections_are_unchanged_returns_304(self, api_client):
+        baker.make(Collection)
+        etag = api_client.get('/store/collections/')['ETag']
+
+        response = api_client.get('/store/collections/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+    def test_if_product_is_added_collection_etag_changes(self, api_client):
+        collection = baker.make(Collection)
+        etag = api_client.get(f'/store/collections/{collection.id}/')['ETag']
+
+        baker.make(Product, collection=collection)
+        response = api_client.get(
+            f'/store/collections/{collection.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['products_count'] == 1
+
+
+
+@pytest.mark.django_db
+class TestProductsCount:
+    def test_if_product_is_created_and_deleted_count_follows(self, api_client):
+        collection = baker.make(Collection)
+        products = baker.make(Product, collection=collection, _quantity=3)
+        products[0].delete()
+
+        response = api_client.get(f'/store/collections/{collection.id}/')
+
+        assert response.data['products_count'] == 2
+
+
+    def test_if_product_is_reassigned_both_counts_change(self):
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+
+        product.collection = new
+        product.save()
+
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert (old.products_count, new.products_count) == (0, 1)
+
+
+    def test_if_queryset_is_updated_counts_are_recomputed(self):
+        old, new = baker.make(Collection, _quantity=2)
+        baker.make(Product, collection=old, _quantity=3)
+
+        Product.objects.filter(collection=old).update(collection=new)
+
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert (old.products_count, new.products_count) == (0, 3)
+
+
+    def test_if_products_are_bulk_created_count_is_recomputed(self):
+        collection = baker.make(Collection)
+
+        Product.objects.bulk_create(
+            baker.prepare(Product, collection=collection, _quantity=4))
+
+        collection.refresh_from_db()
+        assert collection.products_count == 4
+
+
+    def test_if_count_drifted_reconcile_command_fixes_it(self):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.filter(pk=collection.pk).update(products_count=7)
+
+        call_command('reconcile_products_count', stdout=StringIO())
+
+        collection.refresh_from_db()
+        assert collection.products_count == 2
+
+
+    def test_if_count_is_reconciled_collection_etag_changes(self, api_client):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection)
+        Collection.objects.filter(pk=collection.pk).update(products_count=7)
+        etag = api_client.get(f'/store/collections/{collection.id}/')['ETag']
+
+        call_command('reconcile_products_count', stdout=StringIO())
+        response = api_client.get(
+            f'/store/collections/{collection.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['products_count'] == 1
@@ -0,0 +1,57 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F
+from store.models import Collection, Customer, Order, OrderItem, Product
+
+
+def generate(method, **options):
+    call_command(
+        'generate_data', method=method, collections=3, products=20,
+        customers=5, orders=10, stdout=StringIO(), **options)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method', [
+    # COPY FROM STDIN is postgres only
+    pytest.param('copy', marks=pytest.mark.skipif(
+        connection.vendor != 'postgresql', reason='COPY needs postgres')),
+    'bulk_create',
+])
+class TestGenerateData:
+    def test_if_data_is_generated_rows_are_linked(self, method):
+        collections = Collection.objects.count()
+
+        generate(method)
+
+        assert Collection.objects.count() == collections + 3
+        assert Product.objects.count() == 20
+        assert Customer.objects.count() == 5
+        assert Order.objects.count() == 10
+        assert OrderItem.objects.count() >= 10
+        assert not Collection.objects \
+            .annotate(actual=Count('products')) \
+            .exclude(products_count=F('actual')) \
+            .exists()
+        item = OrderItem.objects.select_related('product').first()
+        assert item.unit_price == item.product.unit_price
+
+
+    def test_if_same_seed_is_used_same_data_is_generated(self, method):
+        generate(method, seed=7)
+        first = list(Product.objects.order_by('id').values_list('title', 'unit_price'))
+
+        generate(method, seed=7)
+        both = list(Product.objects.order_by('id').values_list('title', 'unit_price'))
+
+        assert both == first + first
+
+
+    def test_if_data_is_generated_new_rows_can_still_be_created(self, method):
+        generate(method)
+        last_id = Collection.objects.order_by('-id').first().id
+
+        collection = Collection.objects.create(title='a')
+
+        assert collection.id > last_id
@@ -0,0 +1,172 @@
+import pytest
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.utils import timezone
+from PIL import Image
+from store import blobs, images
+from store.models import Blob, Product, ProductImage
+from store.storage import image_storage
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    # .cas-tmp goes next to it
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    settings.STORE_BLOBS = {'GRACE': 0}
+
+
+@pytest.fixture(scope='module')
+def photo():
+    buffer = BytesIO()
+    Image.effect_noise((300, 200), 64).convert('RGB').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def add_image(django_capture_on_commit_callbacks):
+    def do_add(content, name='photo.jpg'):
+        # renditions are generated on commit, celery runs eagerly in tests
+        with django_capture_on_commit_callbacks(execute=True):
+            image = ProductImage.objects.create(
+                product=baker.make(Product), image=SimpleUploadedFile(name, content))
+        image.refresh_from_db()
+        return image
+    return do_add
+
+
+def stored_files(root):
+    return [path for path in Path(root).rglob('*') if path.is_file()]
+
+
+def refcount(name):
+    return Blob.objects.get(name=name).refcount
+
+
+@pytest.mark.django_db
+class TestContentAddressedStorage:
+    def test_if_same_content_is_uploaded_twice_it_is_stored_once(self, settings, photo, add_image):
+        first = add_image(photo, 'vendor.jpg')
+        second = add_image(photo, 'VENDOR-copy.JPG')
+
+        assert first.image.name == second.image.name
+        assert first.image.name.startswith('store/images/')
+        # the original, a thumbnail & a medium copy each as JPEG and WebP
+        assert len(stored_files(settings.MEDIA_ROOT)) == 5
+        assert refcount(first.image.name) == 2
+        assert refcount(first.thumbnail.name) == 2
+
+
+    def test_if_content_differs_it_is_stored_separately(self, photo, add_image):
+        first = add_image(photo)
+        second = add_image(photo + b'\0')
+
+        assert first.image.name != second.image.name
+
+
+    def test_if_content_is_being_written_media_root_has_no_partial_file(self, settings, photo):
+        seen = []
+
+        class WatchedFile(ContentFile):
+            def chunks(self, chunk_size=None):
+                for chunk in super().chunks(chunk_size):
+                    seen.append(stored_files(settings.MEDIA_ROOT))
+                    yield chunk
+
+        name = image_storage().save('store/images/photo.jpg', WatchedFile(photo))
+
+        assert seen and all(files == [] for files in seen)
+        assert stored_files(settings.MEDIA_ROOT) == [Path(image_storage().path(name))]
+        assert list((Path(settings.MEDIA_ROOT).parent / '.cas-tmp').iterdir()) == []
+
+
+    def test_if_upload_is_on_disk_it_is_moved_into_place(self, photo):
+        upload = TemporaryUploadedFile('photo.jpg', 'image/jpeg', len(photo), None)
+        upload.write(photo)
+        upload.seek(0)
+
+        name = image_storage().save('store/images/photo.jpg', upload)
+
+        assert image_storage().open(name).read() == photo
+        assert not Path(upload.temporary_file_path()).exists()
+
+
+    def test_if_photo_has_renditions_they_are_reused(self, monkeypatch, photo, add_image):
+        first = add_image(photo)
+        monkeypatch.setattr(images, 'encode', lambda *args: pytest.fail('rendered again'))
+
+        second = add_image(photo)
+
+        assert second.renditions_ready
+        assert second.medium_webp.name == first.medium_webp.name
+
+
+@pytest.mark.django_db
+class TestOrphanedBlobs:
+    def test_if_one_of_two_images_is_deleted_file_is_kept(self, photo, add_image):
+        first = add_image(photo)
+        add_image(photo).delete()
+
+        assert blobs.delete_orphans() == 0
+        assert refcount(first.image.name) == 1
+        assert image_storage().exists(first.image.name)
+
+
+    def test_if_last_image_is_deleted_files_are_removed(self, settings, photo, add_image):
+        add_image(photo).product.delete()
+
+        assert blobs.delete_orphans() == 5
+        assert not Blob.objects.exists()
+        assert stored_files(settings.MEDIA_ROOT) == []
+
+
+    def test_if_orphan_is_within_grace_period_it_is_kept(self, settings, photo, add_image):
+        settings.STORE_BLOBS = {'GRACE': 60}
+        image = add_image(photo)
+        image.delete()
+
+        assert blobs.delete_orphans() == 0
+        assert image_storage().exists(image.image.name)
+
+
+    def test_if_image_is_replaced_old_file_is_released(self, photo, add_image):
+        image = add_image(photo)
+        old_name = image.image.name
+
+        image.image = SimpleUploadedFile('other.jpg', photo + b'\0')
+        image.save()
+
+        assert refcount(old_name) == 0
+        assert refcount(image.image.name) == 1
+
+
+    def test_if_orphan_is_uploaded_again_it_is_kept(self, settings, photo, add_image):
+        image = add_image(photo)
+        image.delete()
+        settings.STORE_BLOBS = {'GRACE': 60}
+        Blob.objects.update(updated_at=timezone.now() - timedelta(minutes=5))
+
+        name = image_storage().save('store/images/photo.jpg', ContentFile(photo))
+
+        assert name == image.image.name
+        assert blobs.delete_orphans() == 4
+        assert image_storage().exists(name)
+
+
+    def test_if_orphan_is_deleted_while_uploaded_again_it_is_rewritten(self, monkeypatch, photo, add_image):
+        image = add_image(photo)
+        image.delete()
+        touch = blobs.touch
+
+        def delete_orphans_first(name):
+            # delete_orphans() had the row locked when the upload got to it
+            blobs.delete_orphans()
+            touch(name)
+        monkeypatch.setattr(blobs, 'touch', delete_orphans_first)
+
+        name = image_storage().save('store/images/photo.jpg', ContentFile(photo))
+
+        assert image_storage().open(name).read() == photo
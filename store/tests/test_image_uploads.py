@@ -0,0 +1,170 @@
+import pytest
+from datetime import timedelta
+from hashlib import sha256
+from io import BytesIO
+from pathlib import Path
+from django.utils import timezone
+from PIL import Image
+from store import uploads
+from store.models import ImageUpload, Product, ProductImage
+from rest_framework import status
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def upload_dirs(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / 'media'
+    settings.STORE_UPLOADS = {'DIR': tmp_path / 'uploads', 'CHUNK_SIZE': 1000}
+
+
+@pytest.fixture
+def content():
+    buffer = BytesIO()
+    Image.effect_noise((100, 100), 64).convert('RGB').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def start_upload(api_client):
+    def do_start(product, content, **kwargs):
+        return api_client.post(f'/store/products/{product.id}/images/uploads/', {
+            'filename': 'photo.jpg',
+            'size': len(content),
+            'checksum': sha256(content).hexdigest(),
+            **kwargs
+        })
+    return do_start
+
+
+@pytest.fixture
+def send_chunk(api_client):
+    def do_send(product, upload_id, offset, data):
+        return api_client.put(
+            f'/store/products/{product.id}/images/uploads/{upload_id}/', data,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+    return do_send
+
+
+@pytest.fixture
+def finalize(api_client):
+    def do_finalize(product, upload_id):
+        return api_client.post(
+            f'/store/products/{product.id}/images/uploads/{upload_id}/finalize/')
+    return do_finalize
+
+
+@pytest.mark.django_db
+class TestImageUploads:
+    def test_if_all_chunks_are_sent_finalize_returns_201(self, content, start_upload, send_chunk, finalize):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content).data['id']
+
+        for offset in range(0, len(content), 1000):
+            response = send_chunk(product, upload_id, offset, content[offset:offset + 1000])
+            assert response.status_code == status.HTTP_200_OK
+        response = finalize(product, upload_id)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        image = ProductImage.objects.get(pk=response.data['id'])
+        assert image.product_id == product.id
+        assert image.image.read() == content
+        assert not ImageUpload.objects.exists()
+        assert not list(Path(uploads.get_config()['DIR']).iterdir())
+
+
+    def test_if_upload_is_interrupted_it_resumes_from_offset(self, api_client, content, start_upload, send_chunk):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content).data['id']
+        send_chunk(product, upload_id, 0, content[:1000])
+
+        response = api_client.get(f'/store/products/{product.id}/images/uploads/{upload_id}/')
+
+        assert response.data['offset'] == 1000
+        assert response['Upload-Offset'] == '1000'
+
+
+    def test_if_offset_is_wrong_returns_409(self, content, start_upload, send_chunk):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content).data['id']
+        send_chunk(product, upload_id, 0, content[:1000])
+
+        response = send_chunk(product, upload_id, 500, content[500:1500])
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.data['offset'] == 1000
+
+
+    def test_if_chunk_goes_past_declared_size_returns_413(self, content, start_upload, send_chunk):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content[:1500]).data['id']
+        send_chunk(product, upload_id, 0, content[:1000])
+
+        response = send_chunk(product, upload_id, 1000, content[1000:2000])
+
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert ImageUpload.objects.get(pk=upload_id).received == 1000
+
+
+    def test_if_chunk_is_larger_than_chunk_size_returns_413(self, content, start_upload, send_chunk):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content).data['id']
+
+        response = send_chunk(product, upload_id, 0, content[:1001])
+
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+    def test_if_declared_size_is_too_large_returns_400(self, content, start_upload):
+        product = baker.make(Product)
+
+        response = start_upload(product, content, size=3000 * 1024)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'size' in response.data
+
+
+    def test_if_upload_is_incomplete_finalize_returns_409(self, content, start_upload, send_chunk, finalize):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content).data['id']
+        send_chunk(product, upload_id, 0, content[:1000])
+
+        response = finalize(product, upload_id)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert not ProductImage.objects.exists()
+
+
+    def test_if_checksum_does_not_match_finalize_returns_400(self, content, start_upload, send_chunk, finalize):
+        product = baker.make(Product)
+        upload_id = start_upload(product, content, checksum='0' * 64).data['id']
+        for offset in range(0, len(content), 1000):
+            send_chunk(product, upload_id, offset, content[offset:offset + 1000])
+
+        response = finalize(product, upload_id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not ProductImage.objects.exists()
+        assert not ImageUpload.objects.exists()
+
+
+    def test_if_file_is_not_an_image_finalize_returns_400(self, start_upload, send_chunk, finalize):
+        product = baker.make(Product)
+        content = b'not an image'
+        upload_id = start_upload(product, content).data['id']
+        send_chunk(product, upload_id, 0, content)
+
+        response = finalize(product, upload_id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'image' in response.data
+        assert not ProductImage.objects.exists()
+
+
+    def test_if_upload_is_stale_it_is_deleted(self, content):
+        product = baker.make(Product)
+        upload = uploads.start(product.id, 'photo.jpg', len(content), sha256(content).hexdigest())
+        ImageUpload.objects.filter(pk=upload.id).update(
+            created_at=timezone.now() - timedelta(days=2))
+
+        assert uploads.delete_stale() == 1
+        assert not Path(uploads.path(upload)).exists()
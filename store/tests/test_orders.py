@@ -0,0 +1,287 @@
+import pytest
+from threading import Barrier, Thread
+from django.conf import settings
+from django.db import connection
+from store import carts, outbox
+from store.checks import check_outbox_handled_cache
+from store.models import Order, OrderItem, OutboxEvent, Product
+from store.signals import order_created
+from rest_framework import status
+from rest_framework.test import APIClient
+from model_bakery import baker
+
+
+@pytest.fixture
+def create_cart():
+    def do_create_cart(quantities):
+        cart = carts.cart_store.create()
+        for product, quantity in quantities.items():
+            carts.cart_store.add_item(cart.id, product.id, quantity)
+        return cart
+    return do_create_cart
+
+
+def checkout(cart):
+    client = APIClient()
+    client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+    return client.post('/store/orders/', {'cart_id': cart.id})
+
+
+@pytest.mark.django_db
+class TestCheckoutInventory:
+    def test_if_order_is_placed_inventory_is_decremented(self, create_cart):
+        first, second = baker.make(Product, inventory=10, _quantity=2)
+        cart = create_cart({first: 3, second: 10})
+
+        response = checkout(cart)
+
+        assert response.status_code == status.HTTP_200_OK
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (first.inventory, second.inventory) == (7, 0)
+
+
+    def test_if_inventory_is_short_returns_400_per_item(self, create_cart):
+        enough = baker.make(Product, inventory=10)
+        short = baker.make(Product, inventory=1)
+        cart = create_cart({enough: 2, short: 2})
+
+        response = checkout(cart)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['items'] == {str(short.id): ['Only 1 left in stock.']}
+        enough.refresh_from_db()
+        assert enough.inventory == 10
+        assert not Order.objects.exists()
+
+
+
+# transaction=True so checkout's atomic() is a real BEGIN/COMMIT
+# like in production, not a SAVEPOINT inside the test's transaction
+@pytest.mark.django_db(transaction=True)
+class TestCheckoutQueries:
+    # see CreateOrderSerializer.save for the breakdown
+    def test_if_order_is_placed_it_takes_a_fixed_number_of_queries(self, create_cart, django_assert_num_queries, monkeypatch):
+        # the outbox is drained by a worker, not by the request
+        monkeypatch.setattr(outbox, 'kick', lambda: None)
+        products = baker.make(Product, inventory=10, _quantity=20)
+        cart = create_cart({product: 2 for product in products})
+        client = APIClient()
+        client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL))
+
+        with django_assert_num_queries(12):
+            response = client.post('/store/orders/', {'cart_id': cart.id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['items']) == 20
+        assert response.data['items'][0]['product'] == {
+            'id': products[0].id,
+            'title': products[0].title,
+            'unit_price': products[0].unit_price
+        }
+
+
+    def test_if_cart_is_empty_returns_400(self, create_cart):
+        response = checkout(create_cart({}))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['cart_id'] == ['The card is empty.']
+
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentCheckout:
+    def test_if_hot_products_are_bought_concurrently_they_are_not_oversold(self, create_cart):
+        hot = baker.make(Product, inventory=5, _quantity=2)
+        buyers = 8
+        # half of the carts list the products in the opposite order,
+        # locking in cart order would deadlock
+        cart_list = [
+            create_cart({product: 1 for product in (hot if i % 2 else hot[::-1])})
+            for i in range(buyers)
+        ]
+        barrier = Barrier(buyers)
+        statuses = []
+
+        def buy(cart):
+            try:
+                barrier.wait()
+                statuses.append(checkout(cart).status_code)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=buy, args=[cart]) for cart in cart_list]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(statuses) == [status.HTTP_200_OK] * 5 + [status.HTTP_400_BAD_REQUEST] * 3
+        assert [p.inventory for p in Product.objects.filter(pk__in=[p.id for p in hot])] == [0, 0]
+
+
+
+@pytest.fixture
+def receiver():
+    calls = []
+    def on_order_created(sender, **kwargs):
+        calls.append(kwargs['order'].id)
+    order_created.connect(on_order_created)
+    yield calls
+    order_created.disconnect(on_order_created)
+
+
+@pytest.mark.django_db
+class TestOrderCreatedOutbox:
+    def test_if_order_is_placed_receivers_run_only_when_drained(self, create_cart, receiver):
+        cart = create_cart({baker.make(Product, inventory=10): 1})
+
+        order_id = checkout(cart).data['id']
+
+        assert receiver == []
+        assert [e.payload for e in OutboxEvent.objects.all()] == [{'order_id': order_id}]
+        assert outbox.drain() == 1
+        assert receiver == [order_id]
+        assert outbox.drain() == 0
+        assert receiver == [order_id]
+
+
+    def test_if_checkout_fails_no_event_is_written(self, create_cart):
+        cart = create_cart({baker.make(Product, inventory=1): 2})
+
+        checkout(cart)
+
+        assert not OutboxEvent.objects.exists()
+
+
+    def test_if_drain_crashes_events_are_kept_for_the_next_one(self, create_cart, receiver, monkeypatch):
+        cart = create_cart({baker.make(Product, inventory=10): 1})
+        order_id = checkout(cart).data['id']
+
+        def crash(events):
+            raise RuntimeError('worker died')
+        monkeypatch.setitem(outbox.DISPATCHERS, outbox.ORDER_CREATED, crash)
+        with pytest.raises(RuntimeError):
+            outbox.drain()
+        monkeypatch.undo()
+
+        assert OutboxEvent.objects.count() == 1
+        assert outbox.drain() == 1
+        assert receiver == [order_id]
+
+
+    def test_if_topic_has_no_dispatcher_event_is_dead_lettered(self):
+        event = OutboxEvent.objects.create(topic='order_shipped', payload={'order_id': 1})
+
+        assert outbox.drain() == 1
+        assert outbox.drain() == 0
+        event.refresh_from_db()
+        assert event.dead_lettered_at is not None
+
+
+    def test_if_drain_crashes_after_delivery_idempotent_receiver_runs_once(self, create_cart, monkeypatch):
+        checkout(create_cart({baker.make(Product, inventory=10): 1}))
+        event_id = OutboxEvent.objects.get().id
+        calls = []
+
+        @outbox.idempotent
+        def on_order_created(sender, event_id, **kwargs):
+            calls.append(event_id)
+
+        def crash_after_delivery(events, dispatch=outbox.dispatch_order_created):
+            dispatch(events)
+            raise RuntimeError('worker died')
+
+        order_created.connect(on_order_created)
+        try:
+            monkeypatch.setitem(outbox.DISPATCHERS, outbox.ORDER_CREATED, crash_after_delivery)
+            with pytest.raises(RuntimeError):
+                outbox.drain()
+            monkeypatch.undo()
+            assert outbox.drain() == 1
+        finally:
+            order_created.disconnect(on_order_created)
+
+        assert calls == [event_id]
+
+
+    def test_if_receiver_raises_event_is_kept_then_dead_lettered(self, create_cart):
+        order_id = checkout(create_cart({baker.make(Product, inventory=10): 1})).data['id']
+        calls = []
+
+        def on_order_created(sender, order, **kwargs):
+            calls.append(order.id)
+            raise RuntimeError('mail server down')
+
+        order_created.connect(on_order_created)
+        try:
+            for _ in range(outbox.MAX_ATTEMPTS - 1):
+                assert outbox.drain() == 1
+                assert OutboxEvent.objects.get().dead_lettered_at is None
+            assert outbox.drain() == 1
+            assert outbox.drain() == 0
+        finally:
+            order_created.disconnect(on_order_created)
+
+        event = OutboxEvent.objects.get()
+        assert calls == [order_id] * outbox.MAX_ATTEMPTS
+        assert event.attempts == outbox.MAX_ATTEMPTS
+        assert event.dead_lettered_at is not None
+
+
+    def test_if_handled_cache_is_process_local_check_fails(self, settings):
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+        assert [error.id for error in check_outbox_handled_cache(None)] == ['store.E002']
+
+
+    def test_if_handled_cache_is_shared_check_passes(self, settings):
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+
+        assert check_outbox_handled_cache(None) == []
+
+
+
+@pytest.mark.django_db(transaction=True)
+class TestOrderCreatedAfterCommit:
+    def test_if_order_is_committed_worker_notifies_receivers(self, create_cart, receiver):
+        cart = create_cart({baker.make(Product, inventory=10): 1})
+
+        order_id = checkout(cart).data['id']
+
+        assert receiver == [order_id]
+        assert not OutboxEvent.objects.exists()
+
+
+
+@pytest.mark.django_db
+class TestListOrders:
+    def test_if_user_lists_orders_only_their_own_are_returned(self, api_client):
+        user = baker.make(settings.AUTH_USER_MODEL)
+        other = baker.make(settings.AUTH_USER_MODEL)
+        own = baker.make(Order, customer=user.customer)
+        baker.make(Order, customer=other.customer)
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get('/store/orders/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [order['id'] for order in response.data['results']] == [own.id]
+
+
+    def test_if_staff_lists_orders_query_count_does_not_grow(self, api_client, django_assert_num_queries):
+        customer = baker.make(settings.AUTH_USER_MODEL).customer
+        for order in baker.make(Order, customer=customer, _quantity=10):
+            baker.make(OrderItem, order=order, unit_price=1, _quantity=3)
+        api_client.force_authenticate(user=baker.make(settings.AUTH_USER_MODEL, is_staff=True))
+
+        # count, orders, items with their products
+        with django_assert_num_queries(3):
+            response = api_client.get('/store/orders/')
+
+        assert response.data['count'] == 10
+        assert len(response.data['results']) == 10
+        assert len(response.data['results'][0]['items']) == 3
+        assert response.data['results'][0]['items'][0]['product']['title'] is not None
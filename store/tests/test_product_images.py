@@ -0,0 +1,111 @@
+import pytest
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from store import blobs
+from store.cache import product_cache
+from store.models import Product, ProductImage
+from rest_framework import status
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    product_cache.clear()
+
+
+def make_upload(size=(1600, 1200), mode='RGB', format='JPEG', name='photo.jpg'):
+    buffer = BytesIO()
+    # noise so the original isn't trivially compressible
+    image = Image.effect_noise(size, 64).convert(mode)
+    if mode == 'RGBA':
+        image.putalpha(Image.linear_gradient('L').resize(size))
+    image.save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@pytest.fixture
+def upload_image(api_client, django_capture_on_commit_callbacks):
+    def do_upload(product, **kwargs):
+        # the task is queued on commit, celery runs eagerly in tests
+        with django_capture_on_commit_callbacks(execute=True):
+            return api_client.post(
+                f'/store/products/{product.id}/images/',
+                {'image': make_upload(**kwargs)}, format='multipart')
+    return do_upload
+
+
+@pytest.mark.django_db
+class TestImageRenditions:
+    def test_if_image_is_uploaded_renditions_are_generated(self, upload_image):
+        product = baker.make(Product)
+
+        response = upload_image(product)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        image = ProductImage.objects.get(pk=response.data['id'])
+        assert image.renditions_ready
+        with Image.open(image.thumbnail) as thumbnail:
+            assert (thumbnail.format, thumbnail.size) == ('JPEG', (200, 200))
+        with Image.open(image.thumbnail_webp) as thumbnail:
+            assert (thumbnail.format, thumbnail.size) == ('WEBP', (200, 200))
+        with Image.open(image.medium) as medium:
+            assert (medium.format, medium.size) == ('JPEG', (800, 600))
+        with Image.open(image.medium_webp) as medium:
+            assert (medium.format, medium.size) == ('WEBP', (800, 600))
+
+
+    def test_if_renditions_are_ready_product_returns_their_urls(self, api_client, upload_image):
+        product = baker.make(Product)
+        upload_image(product)
+
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        image = ProductImage.objects.get(product=product)
+        data = response.data['images'][0]
+        assert data['thumbnail'].endswith(image.thumbnail.url)
+        assert data['medium_webp'].endswith(image.medium_webp.url)
+        # what list pages download instead of the original
+        assert image.thumbnail.size * 10 < image.image.size
+        assert image.medium.size * 2 < image.image.size
+
+
+    def test_if_renditions_are_not_ready_returns_null(self, api_client):
+        product = baker.make(Product)
+        baker.make(ProductImage, product=product, image='store/images/a.jpg')
+
+        response = api_client.get(f'/store/products/{product.id}/images/')
+
+        assert response.data[0]['image'].endswith('store/images/a.jpg')
+        assert response.data[0]['thumbnail'] is None
+
+
+    def test_if_image_has_transparency_jpeg_is_flattened(self, upload_image):
+        product = baker.make(Product)
+
+        response = upload_image(product, size=(300, 300), mode='RGBA', format='PNG', name='logo.png')
+
+        image = ProductImage.objects.get(pk=response.data['id'])
+        with Image.open(image.thumbnail) as thumbnail:
+            assert thumbnail.mode == 'RGB'
+        with Image.open(image.thumbnail_webp) as thumbnail:
+            assert thumbnail.mode == 'RGBA'
+
+
+    def test_if_image_is_replaced_old_renditions_are_removed(self, settings, upload_image, django_capture_on_commit_callbacks):
+        settings.STORE_BLOBS = {'GRACE': 0}
+        product = baker.make(Product)
+        image = ProductImage.objects.get(pk=upload_image(product).data['id'])
+        old_thumbnail = image.thumbnail.name
+
+        with django_capture_on_commit_callbacks(execute=True):
+            image.image = make_upload(name='other.jpg')
+            image.save()
+
+        image.refresh_from_db()
+        assert image.renditions_ready
+        assert image.thumbnail.name != old_thumbnail
+        # unreferenced now, deleted by the orphan cleanup
+        blobs.delete_orphans()
+        assert not image.thumbnail.storage.exists(old_thumbnail)
@@ -0,0 +1,283 @@
+import json
+import pytest
+import time
+from base64 import urlsafe_b64encode
+from django.db import connection, transaction
+from django.utils.http import http_date
+from store import search
+from store.cache import LocalLRUBackend, bump_versions, product_cache
+from store.checks import check_product_cache_versions
+from store.models import Collection, Product, ProductImage
+from rest_framework import status
+from rest_framework.request import Request
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def clear_product_cache():
+    product_cache.clear()
+
+
+@pytest.mark.django_db
+class TestProductCache:
+    def test_if_product_is_cached_second_retrieve_hits_no_db(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        api_client.get(f'/store/products/{product.id}/')
+
+        with django_assert_num_queries(0):
+            response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == product.id
+
+
+    def test_if_product_is_updated_retrieve_returns_fresh_data(self, api_client):
+        product = baker.make(Product, title='old')
+        api_client.get(f'/store/products/{product.id}/')
+
+        product.title = 'new'
+        product.save()
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.data['title'] == 'new'
+
+
+    def test_if_products_are_updated_in_bulk_cached_payloads_are_fresh(self, api_client):
+        product = baker.make(Product, unit_price=1)
+        list_url = f'/store/products/?collection_id={product.collection_id}'
+        api_client.get(f'/store/products/{product.id}/')
+        api_client.get(list_url)
+
+        Product.objects.filter(pk=product.id).update(unit_price=2)
+
+        assert api_client.get(f'/store/products/{product.id}/').data['price'] == 2
+        assert api_client.get(list_url).data['results'][0]['price'] == 2
+
+
+    def test_if_products_are_created_in_bulk_collection_list_is_invalidated(self, api_client):
+        collection = baker.make(Collection)
+        url = f'/store/products/?collection_id={collection.id}'
+        api_client.get(url)
+
+        Product.objects.bulk_create([baker.prepare(Product, collection=collection)])
+
+        assert api_client.get(url).data['count'] == 1
+
+
+    def test_if_image_is_added_collection_list_is_invalidated(self, api_client):
+        product = baker.make(Product)
+        url = f'/store/products/?collection_id={product.collection_id}'
+        api_client.get(url)
+
+        baker.make(ProductImage, product=product, image='store/images/a.jpg')
+        response = api_client.get(url)
+
+        assert len(response.data['results'][0]['images']) == 1
+
+
+    def test_if_product_moves_collection_old_list_is_invalidated(self, api_client):
+        product = baker.make(Product)
+        old_collection_id = product.collection_id
+        url = f'/store/products/?collection_id={old_collection_id}'
+        api_client.get(url)
+
+        product.collection = baker.make(Collection)
+        product.save()
+        response = api_client.get(url)
+
+        assert response.data['count'] == 0
+
+
+    def test_if_query_params_are_reordered_cache_key_is_the_same(self, rf):
+        first = Request(rf.get('/store/products/?page=1&ordering=id'))
+        second = Request(rf.get('/store/products/?ordering=id&page=1'))
+
+        assert product_cache.list_key(first) == product_cache.list_key(second)
+
+
+    def test_if_local_entry_is_older_than_timeout_it_is_missed(self, monkeypatch):
+        backend = LocalLRUBackend(timeout=30)
+        now = time.monotonic()
+        backend.set('key', {'data': 1})
+
+        monkeypatch.setattr(time, 'monotonic', lambda: now + 31)
+
+        assert backend.get('key') is None
+
+
+    def test_if_versions_cache_is_process_local_check_fails(self, settings):
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+        assert [error.id for error in check_product_cache_versions(None)] == ['store.E001']
+
+
+    def test_if_versions_cache_is_shared_check_passes(self, settings):
+        settings.DEBUG = False
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+
+        assert check_product_cache_versions(None) == []
+
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def test_if_product_is_unchanged_returns_304_without_queries(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        etag = api_client.get(f'/store/products/{product.id}/')['ETag']
+
+        with django_assert_num_queries(0):
+            response = api_client.get(
+                f'/store/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+
+    def test_if_product_is_updated_returns_200_with_new_etag(self, api_client):
+        product = baker.make(Product)
+        etag = api_client.get(f'/store/products/{product.id}/')['ETag']
+
+        product.title = 'new'
+        product.save()
+        response = api_client.get(
+            f'/store/products/{product.id}/', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+
+    def test_if_inventory_is_reserved_if_modified_since_returns_200(self, api_client):
+        product = baker.make(Product, inventory=10)
+        response = api_client.get(f'/store/products/{product.id}/')
+        assert 'Last-Modified' not in response
+
+        # checkout's reserve() is an update(), last_update stays as it was
+        with transaction.atomic():
+            Product.objects.reserve({product.id: 3})
+            bump_versions(product_ids=[product.id], collection_ids=[product.collection_id])
+        response = api_client.get(
+            f'/store/products/{product.id}/',
+            HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['inventory'] == 7
+
+
+    def test_if_product_does_not_exist_if_none_match_star_returns_404(self, api_client):
+        response = api_client.get('/store/products/0/', HTTP_IF_NONE_MATCH='*')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_product_is_added_to_collection_list_etag_changes(self, api_client):
+        collection = baker.make(Collection)
+        url = f'/store/products/?collection_id={collection.id}'
+        etag = api_client.get(url)['ETag']
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        baker.make(Product, collection=collection)
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['count'] == 1
+
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_if_pages_are_followed_every_product_is_returned_once(self, api_client):
+        collection = baker.make(Collection)
+        # lots of ties on unit_price, id has to break them
+        products = baker.make(
+            Product, collection=collection, unit_price=5, _quantity=25)
+        url = f'/store/products/?collection_id={collection.id}&pagination=cursor&ordering=-unit_price'
+
+        seen = []
+        while url:
+            response = api_client.get(url)
+            assert 'count' not in response.data
+            seen += [product['id'] for product in response.data['results']]
+            url = response.data['next']
+
+        assert seen == sorted([product.id for product in products], reverse=True)
+
+
+    def test_if_previous_link_is_followed_returns_previous_page(self, api_client):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=15)
+        url = f'/store/products/?collection_id={collection.id}&pagination=cursor'
+        first_page = api_client.get(url).data
+
+        second_page = api_client.get(first_page['next']).data
+        response = api_client.get(second_page['previous'])
+
+        assert response.data['results'] == first_page['results']
+        assert response.data['previous'] is None
+
+
+    def test_if_cursor_is_invalid_returns_404(self, api_client):
+        response = api_client.get('/store/products/?pagination=cursor&cursor=nope')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_cursor_value_is_malformed_returns_404(self, api_client):
+        cursor = urlsafe_b64encode(json.dumps({'v': 'abc', 'id': 1, 'r': False}).encode()).decode()
+
+        response = api_client.get(
+            f'/store/products/?pagination=cursor&ordering=unit_price&cursor={cursor}')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+
+# prefix matching & ranking come from postgres full text search
+postgres_only = pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='needs postgres full text search')
+
+
+@pytest.mark.django_db
+class TestSearchProducts:
+    @postgres_only
+    def test_if_term_matches_title_prefix_returns_product(self, api_client):
+        product = baker.make(Product, title='Wireless keyboard')
+        baker.make(Product, title='Coffee mug')
+
+        response = api_client.get('/store/products/?search=keyb')
+
+        assert [p['id'] for p in response.data['results']] == [product.id]
+
+
+    @postgres_only
+    def test_if_title_matches_it_ranks_above_description(self, api_client):
+        collection = baker.make(Collection)
+        by_description = baker.make(
+            Product, collection=collection, title='Mug', description='tea tea')
+        by_title = baker.make(
+            Product, collection=collection, title='Tea', description='cup')
+
+        response = api_client.get(
+            f'/store/products/?collection_id={collection.id}&search=tea')
+
+        assert [p['id'] for p in response.data['results']] == [by_title.id, by_description.id]
+
+
+    def test_if_collection_is_renamed_its_products_are_searchable(self, api_client):
+        product = baker.make(Product, title='Mug')
+        collection = product.collection
+
+        collection.title = 'Kitchenware'
+        collection.save()
+        response = api_client.get('/store/products/?search=kitchenware')
+
+        assert [p['id'] for p in response.data['results']] == [product.id]
+
+
+    def test_if_full_text_search_is_unsupported_falls_back_to_ilike(self, api_client, monkeypatch):
+        monkeypatch.setattr(search, 'is_supported', lambda: False)
+        product = baker.make(Product, title='Wireless keyboard')
+
+        response = api_client.get('/store/products/?search=eless keyb')
+
+        assert [p['id'] for p in response.data['results']] == [product.id]
@@ -0,0 +1,86 @@
+import pytest
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from store import replicas
+from store.cache import product_cache
+from store.models import Product, Review
+from rest_framework import status
+from rest_framework.test import APIClient
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def replica(settings):
+    settings.STORE_REPLICAS = {'ALIASES': ['replica'], 'MAX_LAG': 2, 'PIN_SECONDS': 5}
+    replicas.clear_lag_cache()
+    product_cache.clear()
+
+
+def queries_on(alias):
+    return CaptureQueriesContext(connections[alias])
+
+
+# the replica is a second connection to the test database,
+# it only sees committed rows
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+class TestReplicaRouting:
+    def test_if_reviews_are_listed_they_are_read_from_replica(self):
+        product = baker.make(Product)
+        baker.make(Review, product=product, _quantity=3)
+
+        with queries_on('default') as primary, queries_on('replica') as replica:
+            response = APIClient().get(f'/store/products/{product.id}/reviews/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 3
+        assert len(primary) == 0
+        assert len(replica) > 0
+
+
+    def test_if_products_are_cached_they_are_read_from_primary(self):
+        product = baker.make(Product)
+
+        with queries_on('default') as primary, queries_on('replica') as replica:
+            list_response = APIClient().get('/store/products/')
+            detail_response = APIClient().get(f'/store/products/{product.id}/')
+
+        assert list_response.data['count'] == 1
+        assert detail_response.data['id'] == product.id
+        assert len(primary) > 0
+        assert len(replica) == 0
+
+
+    def test_if_client_just_wrote_it_reads_from_primary(self):
+        product = baker.make(Product)
+        client = APIClient()
+        client.post(
+            f'/store/products/{product.id}/reviews/',
+            {'name': 'a', 'description': 'b'})
+
+        with queries_on('default') as primary, queries_on('replica') as replica:
+            response = client.get(f'/store/products/{product.id}/reviews/')
+
+        assert len(response.data['results']) == 1
+        assert len(primary) > 0
+        assert len(replica) == 0
+
+
+    def test_if_replica_lags_it_reads_from_primary(self, monkeypatch):
+        product = baker.make(Product)
+        monkeypatch.setattr(replicas, 'replica_lag', lambda alias: 10)
+
+        with queries_on('default') as primary, queries_on('replica') as replica:
+            APIClient().get(f'/store/products/{product.id}/reviews/')
+
+        assert len(primary) > 0
+        assert len(replica) == 0
+
+
+    def test_if_cart_is_read_it_stays_on_primary(self):
+        cart_id = APIClient().post('/store/carts/').data['id']
+
+        with queries_on('replica') as replica:
+            response = APIClient().get(f'/store/carts/{cart_id}/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(replica) == 0
@@ -0,0 +1,156 @@
+import json
+import pytest
+from base64 import urlsafe_b64encode
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from store.cache import product_cache
+from store.models import Product, Review
+from rest_framework import status
+from model_bakery import baker
+
+
+@pytest.fixture(autouse=True)
+def clear_product_cache():
+    product_cache.clear()
+
+
+@pytest.fixture
+def make_reviews():
+    def do_make(product, count):
+        # one review per day, the newest today
+        reviews = baker.make(Review, product=product, _quantity=count)
+        for days, review in enumerate(reversed(reviews)):
+            Review.objects.filter(pk=review.pk).update(date=date.today() - timedelta(days=days))
+        return [review.pk for review in reviews]
+    return do_make
+
+
+@pytest.mark.django_db
+class TestReviewPagination:
+    def test_if_reviews_are_listed_returns_newest_first_in_one_query(self, api_client, make_reviews, django_assert_num_queries):
+        product = baker.make(Product)
+        ids = make_reviews(product, 15)
+
+        with django_assert_num_queries(1):
+            response = api_client.get(f'/store/products/{product.id}/reviews/')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response.data
+        assert [review['id'] for review in response.data['results']] == ids[::-1][:10]
+        assert response.data['previous'] is None
+
+
+    def test_if_next_link_is_followed_returns_the_rest(self, api_client, make_reviews):
+        product = baker.make(Product)
+        ids = make_reviews(product, 15)
+        first = api_client.get(f'/store/products/{product.id}/reviews/')
+
+        response = api_client.get(first.data['next'])
+
+        assert [review['id'] for review in response.data['results']] == ids[::-1][10:]
+        assert response.data['next'] is None
+        assert response.data['previous'] is not None
+
+
+    def test_if_ordering_is_date_returns_oldest_first(self, api_client, make_reviews):
+        product = baker.make(Product)
+        ids = make_reviews(product, 3)
+
+        response = api_client.get(f'/store/products/{product.id}/reviews/?ordering=date')
+
+        assert [review['id'] for review in response.data['results']] == ids
+
+
+    def test_if_cursor_is_invalid_returns_404(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.get(f'/store/products/{product.id}/reviews/?cursor=nope')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_cursor_date_is_malformed_returns_404(self, api_client):
+        product = baker.make(Product)
+        cursor = urlsafe_b64encode(
+            json.dumps({'v': '2024-13-45', 'id': 1, 'r': False}).encode()).decode()
+
+        response = api_client.get(f'/store/products/{product.id}/reviews/?cursor={cursor}')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestReviewStats:
+    def test_if_review_is_posted_product_returns_new_stats(self, api_client):
+        product = baker.make(Product)
+        api_client.get(f'/store/products/{product.id}/')
+
+        api_client.post(
+            f'/store/products/{product.id}/reviews/', {'name': 'a', 'description': 'b'})
+        response = api_client.get(f'/store/products/{product.id}/')
+
+        assert response.data['reviews_count'] == 1
+        assert response.data['last_review_date'] == date.today().isoformat()
+
+
+    def test_if_reviews_are_posted_and_deleted_product_keeps_its_place(self, api_client):
+        product = baker.make(Product)
+        last_update = Product.objects.get(pk=product.pk).last_update
+
+        response = api_client.post(
+            f'/store/products/{product.id}/reviews/', {'name': 'a', 'description': 'b'})
+        api_client.delete(f'/store/products/{product.id}/reviews/{response.data["id"]}/')
+
+        # last_update is an ordering & cursor field, reviews mustn't move the product
+        assert Product.objects.get(pk=product.pk).last_update == last_update
+
+
+    def test_if_latest_review_is_deleted_last_date_is_recomputed(self, api_client, make_reviews):
+        product = baker.make(Product)
+        ids = make_reviews(product, 3)
+
+        api_client.delete(f'/store/products/{product.id}/reviews/{ids[-1]}/')
+
+        product.refresh_from_db()
+        assert product.reviews_count == 2
+        assert product.last_review_date == date.today() - timedelta(days=1)
+
+
+    def test_if_products_are_listed_stats_add_no_queries(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        api_client.post(
+            f'/store/products/{product.id}/reviews/', {'name': 'a', 'description': 'b'})
+        baker.make(Product, collection=product.collection, _quantity=4)
+        product_cache.clear()
+
+        # products & their images
+        with django_assert_num_queries(3):
+            response = api_client.get('/store/products/')
+
+        counts = {p['id']: p['reviews_count'] for p in response.data['results']}
+        assert counts[product.id] == 1
+        assert sum(counts.values()) == 1
+
+
+    def test_if_stats_drifted_reconcile_fixes_them(self, make_reviews):
+        product = baker.make(Product)
+        make_reviews(product, 2)
+        Product.objects.filter(pk=product.pk).update(reviews_count=7, last_review_date=None)
+
+        call_command('reconcile_review_stats', stdout=StringIO())
+
+        product.refresh_from_db()
+        assert product.reviews_count == 2
+        assert product.last_review_date == date.today()
+
+
+    def test_if_stats_are_reconciled_cached_product_is_fresh(self, api_client, make_reviews):
+        product = baker.make(Product)
+        make_reviews(product, 2)
+        Product.objects.filter(pk=product.pk).update(reviews_count=7)
+        assert api_client.get(f'/store/products/{product.id}/').data['reviews_count'] == 7
+
+        call_command('reconcile_review_stats', stdout=StringIO())
+
+        assert api_client.get(f'/store/products/{product.id}/').data['reviews_count'] == 2
@@ -0,0 +1,116 @@
+import hashlib
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import ImageUpload
+
+
+# Resumable, chunked uploads of product images:
+#   1. POST /store/products/1/images/uploads/ {filename, size, checksum}
+#      checksum is the sha256 (hex) of the whole file
+#   2. PUT .../uploads/<id>/ with raw bytes and an Upload-Offset header,
+#      as many times as needed; GET .../uploads/<id>/ returns the offset
+#      to resume from after a failure
+#   3. POST .../uploads/<id>/finalize/ checks the checksum and creates
+#      the ProductImage
+# Chunks are streamed to a file in DIR, the request body is never held
+# in memory, and a chunk going past the declared size is refused before
+# any of it is read. DIR has to be shared by all the app servers.
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    pass
+
+
+class ChunkTooLarge(Exception):
+    pass
+
+
+def get_config():
+    return {
+        'DIR': os.path.join(settings.BASE_DIR, 'uploads'),
+        'CHUNK_SIZE': 1024 * 1024,
+        'EXPIRE_AFTER': 60 * 60 * 24,
+        **getattr(settings, 'STORE_UPLOADS', {})
+    }
+
+
+def path(upload):
+    return os.path.join(get_config()['DIR'], f'{upload.id}.part')
+
+
+def start(product_id, filename, size, checksum):
+    upload = ImageUpload.objects.create(
+        product_id=product_id, filename=filename, size=size, checksum=checksum)
+    os.makedirs(get_config()['DIR'], exist_ok=True)
+    open(path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload_id, offset, length, stream):
+    # the row lock keeps two requests from writing to the same
+    # upload at once (a client retrying a chunk it thinks failed)
+    with transaction.atomic():
+        upload = ImageUpload.objects.select_for_update().get(pk=upload_id)
+        if offset != upload.received:
+            raise OffsetMismatch(upload.received)
+        if length > get_config()['CHUNK_SIZE'] or offset + length > upload.size:
+            raise ChunkTooLarge(upload.received)
+
+        with open(path(upload), 'r+b') as file:
+            # drop anything a crashed request wrote past the last offset
+            file.seek(offset)
+            file.truncate()
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    # client went away, keep what arrived
+                    break
+                file.write(data)
+                remaining -= len(data)
+
+        upload.received = offset + length - remaining
+        upload.save(update_fields=['received'])
+    return upload
+
+
+def checksum(upload):
+    sha256 = hashlib.sha256()
+    with open(path(upload), 'rb') as file:
+        while data := file.read(READ_SIZE):
+            sha256.update(data)
+    return sha256.hexdigest()
+
+
+class UploadedFile(File):
+    # with temporary_file_path() the ImageField validation reads the
+    # image from disk and the image storage moves the file into place
+    # instead of copying it
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def open_file(upload):
+    return UploadedFile(open(path(upload), 'rb'), name=upload.filename)
+
+
+def discard(upload):
+    try:
+        os.remove(path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def delete_stale():
+    expired = timezone.now() - timedelta(seconds=get_config()['EXPIRE_AFTER'])
+    count = 0
+    for upload in ImageUpload.objects.filter(created_at__lt=expired):
+        discard(upload)
+        count += 1
+    return count
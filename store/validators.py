@@ -1,8 +1,11 @@
 from django.core.exceptions import ValidationError
 
 
+MAX_FILE_SIZE_KB = 2000
+
+
 def validate_file_size(file):
-    max_kb_size = 2000
+    max_kb_size = MAX_FILE_SIZE_KB
 
     if file.size > max_kb_size * 1024:
         raise ValidationError(
@@ -1,20 +1,36 @@
 # store/views.py
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db.models.aggregates import Count
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend  # gives generic filtering
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny, DjangoModelPermissions, IsAdminUser, DjangoModelPermissionsOrAnonReadOnly
 from rest_framework.response import Response
 from rest_framework.mixins import CreateModelMixin, ListModelMixin, UpdateModelMixin, RetrieveModelMixin, DestroyModelMixin
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework import status
-from .filters import ProductFilter
-from .pagination import DefaultPagination
+from . import carts, replicas, uploads
+from .cache import product_cache
+from .filters import ProductFilter, ProductSearchFilter
+from .pagination import DefaultPagination, ProductPagination, ReviewPagination
 from .permissions import IsAdminOrReadOnly, FullDjangoModelPermissions, ViewCustomerHistoryPermission
-from .models import Product, Collection, OrderItem, Review, Cart, CartItem, Customer, Order, ProductImage
-from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CustomerSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderSerializer, ProductImageSerializer
+from .models import Product, Collection, OrderItem, Review, Customer, Order, ProductImage, ImageUpload
+from .serializers import ProductSerializer, CollectionSerializer, ReviewSerializer, CartSerializer, CartItemSerializer, AddCartItemSerializer, UpdateCartItemSerializer, CustomerSerializer, OrderSerializer, CreateOrderSerializer, UpdateOrderSerializer, ProductImageSerializer, ImageUploadSerializer
+
+
+def not_modified(request, etag):
+    # 304 (or 412) when the client's copy is still current, None otherwise
+    return get_conditional_response(request, etag=etag)
+
+
+def with_validators(response, etag):
+    # ETag only: it comes from the version counters, which every write
+    # bumps; last_update isn't touched by update()s like reserve()
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+        response['ETag'] = etag
+    return response
 
 
 # pylint: disable=no-member
@@ -23,9 +39,9 @@ class ProductViewSet(ModelViewSet):
     queryset = Product.objects.prefetch_related('product_images').all()
     serializer_class = ProductSerializer
     filter_backends = [
-        DjangoFilterBackend, SearchFilter, OrderingFilter]
+        DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     filterset_class = ProductFilter
-    pagination_class = DefaultPagination
+    pagination_class = ProductPagination
     permission_classes = [IsAdminOrReadOnly]
     search_fields = ['title', 'description', 'collection__title']
     ordering_fields = ['id', 'unit_price', 'last_update']
@@ -34,6 +50,34 @@ class ProductViewSet(ModelViewSet):
         # pass serializer context
         return {'request': self.request}
 
+    # list & retrieve are read-through cached,
+    # writes bump version counters in store.signals.handlers
+    def list(self, request, *args, **kwargs):
+        def fill():
+            return {'data': super(ProductViewSet, self).list(request, *args, **kwargs).data}
+        return self.cached_response(request, product_cache.list_key(request), fill)
+
+    def retrieve(self, request, *args, **kwargs):
+        def fill():
+            return {'data': self.get_serializer(self.get_object()).data}
+        return self.cached_response(
+            request, product_cache.detail_key(request, kwargs['pk']), fill)
+
+    def cached_response(self, request, key, fill):
+        # the ETag comes from the cache key (i.e. the version counters),
+        # a cached, unchanged product answers 304 before any query
+        etag = product_cache.etag(key)
+        entry = product_cache.get(key)
+        if entry is None:
+            # fill() 404s first, so If-None-Match: * can't match
+            # a product that doesn't exist. It reads from the primary,
+            # a lagging replica would cache old rows under the new version
+            with replicas.primary():
+                entry = fill()
+            product_cache.set(key, entry)
+        response = not_modified(request, etag) or Response(entry['data'])
+        return with_validators(response, etag)
+
     def destroy(self, request, *args, **kwargs):
         if OrderItem.objects.filter(product_id=kwargs['pk']).count() > 0:
             return Response(
@@ -46,11 +90,24 @@ class ProductViewSet(ModelViewSet):
 
 
 class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(
-        products_count=Count('products')).all()
+    # products_count is a stored counter, no GROUP BY over products
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    # no timestamp on collections, only an ETag from the version counters
+    def list(self, request, *args, **kwargs):
+        etag = product_cache.etag(product_cache.collection_key(request))
+        response = not_modified(request, etag) \
+            or super().list(request, *args, **kwargs)
+        return with_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = product_cache.etag(product_cache.collection_key(request, kwargs['pk']))
+        response = not_modified(request, etag) \
+            or super().retrieve(request, *args, **kwargs)
+        return with_validators(response, etag)
+
     def destroy(self, request, *args, **kwargs):
         if Product.objects.filter(collection_id=kwargs['pk']):
             return Response(
@@ -65,6 +122,8 @@ class CollectionViewSet(ModelViewSet):
 # in ViewSets we have access to URL parameters
 class ReviewViewSet(ModelViewSet):
     serializer_class = ReviewSerializer
+    # ?ordering=date for oldest first
+    pagination_class = ReviewPagination
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs['product_pk'])
@@ -81,9 +140,21 @@ class CartViewSet(CreateModelMixin,
                   RetrieveModelMixin, 
                   DestroyModelMixin, 
                   GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    # carts come from the configured cart store (settings.STORE_CARTS)
     serializer_class = CartSerializer
 
+    def get_queryset(self):
+        return carts.cart_store.all()
+
+    def get_object(self):
+        cart = carts.cart_store.get(self.kwargs['pk'])
+        if cart is None:
+            raise Http404
+        return cart
+
+    def perform_destroy(self, instance):
+        carts.cart_store.delete(instance.id)
+
 
 
 class CartItemViewSet(ModelViewSet):
@@ -100,9 +171,17 @@ class CartItemViewSet(ModelViewSet):
         return {'cart_id': self.kwargs['cart_pk']}
 
     def get_queryset(self):
-        return CartItem.objects \
-            .filter(cart_id=self.kwargs['cart_pk']) \
-            .select_related('product')
+        return carts.cart_store.get_items(self.kwargs['cart_pk'])
+
+    def get_object(self):
+        item = carts.cart_store.get_item(
+            self.kwargs['cart_pk'], self.kwargs['pk'])
+        if item is None:
+            raise Http404
+        return item
+
+    def perform_destroy(self, instance):
+        carts.cart_store.delete_item(instance)
 
 
 class CustomerViewSet(ModelViewSet):
@@ -139,6 +218,8 @@ class OrderViewSet(ModelViewSet):
         'get', 'post', 'patch', 'delete', 
         'head', 'options'
     ]
+    # staff see every order, a page at a time keeps that bounded
+    pagination_class = DefaultPagination
 
     def get_permissions(self):
         # get_permissions returns list of objects
@@ -165,14 +246,14 @@ class OrderViewSet(ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # newest first, and a stable order for pagination
+        queryset = Order.objects.with_items().order_by('-id')
 
         if user.is_staff:
-            return Order.objects.all()
+            return queryset
         
-        customer_id = (
-            Customer.objects.only('id').get(user_id=user.id)
-        )
-        return Order.objects.filter(customer_id=customer_id)
+        # filter through the join, no separate customer lookup
+        return queryset.filter(customer__user_id=user.id)
 
 
 class ProductImageViewSet(ModelViewSet):
@@ -184,3 +265,78 @@ class ProductImageViewSet(ModelViewSet):
     def get_queryset(self):
         return ProductImage.objects.filter(
             product_id=self.kwargs['product_pk'])
+
+    # chunked, resumable uploads (see store/uploads.py)
+    @action(detail=False, methods=['POST'])
+    def uploads(self, request, product_pk):
+        get_object_or_404(Product, pk=product_pk)
+        serializer = ImageUploadSerializer(
+            data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['GET', 'PUT'],
+            url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)')
+    def upload(self, request, product_pk, upload_id):
+        upload = self.get_upload(upload_id)
+        if request.method == 'GET':
+            return self.offset_response(upload.received)
+
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+            if offset < 0 or length < 0:
+                raise ValueError
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Upload-Offset and Content-Length headers are required.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # the body is read straight from the request stream,
+            # request.data is never touched
+            upload = uploads.write_chunk(upload.id, offset, length, request.stream)
+        except uploads.OffsetMismatch as error:
+            return self.offset_response(
+                error.args[0], status.HTTP_409_CONFLICT,
+                'Upload-Offset does not match the bytes received so far.')
+        except uploads.ChunkTooLarge as error:
+            return self.offset_response(
+                error.args[0], status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                'Chunk is larger than chunk_size or goes past the declared size.')
+        return self.offset_response(upload.received)
+
+    @action(detail=False, methods=['POST'],
+            url_path=r'uploads/(?P<upload_id>[0-9a-f-]+)/finalize')
+    def finalize_upload(self, request, product_pk, upload_id):
+        upload = self.get_upload(upload_id)
+        if upload.received != upload.size:
+            return self.offset_response(
+                upload.received, status.HTTP_409_CONFLICT, 'Upload is incomplete.')
+        if uploads.checksum(upload) != upload.checksum:
+            # resuming can't fix a corrupted file, start over
+            uploads.discard(upload)
+            return Response(
+                {'error': 'Checksum does not match, upload the file again.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        with uploads.open_file(upload) as file:
+            serializer = ProductImageSerializer(
+                data={'image': file}, context=self.get_serializer_context())
+            valid = serializer.is_valid()
+            if valid:
+                serializer.save()
+        uploads.discard(upload)
+        if not valid:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def get_upload(self, upload_id):
+        return get_object_or_404(
+            ImageUpload, pk=upload_id, product_id=self.kwargs['product_pk'])
+
+    def offset_response(self, offset, status_code=status.HTTP_200_OK, error=None):
+        data = {'offset': offset}
+        if error:
+            data['error'] = error
+        return Response(data, status=status_code, headers={'Upload-Offset': str(offset)})
@@ -3,6 +3,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import timedelta
+from importlib.util import find_spec
+from corsheaders.defaults import default_headers
 from celery.schedules import crontab
 
 
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 # requests come to middleware & pass to next ones or return response
 # job of middleware: read user info from request & set user attr. on request object
 MIDDLEWARE = [
+    "core.middleware.RequestMetricsMiddleware",
+    "store.replicas.ReplicaMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -62,10 +66,25 @@ INTERNAL_IPS = [
     # ...
 ]
 
+# per request SQL & timing, see core.middleware
+REQUEST_METRICS = {
+    # share of requests measured, keeps the overhead down
+    'SAMPLE_RATE': 0.1,
+    # who can read /metrics/: staff users, or a scraper sending
+    # "Authorization: Bearer <TOKEN>". ALLOWED_IPS (empty: any) narrows
+    # that down but is no protection on its own, behind a proxy on the
+    # same host every request comes from 127.0.0.1.
+    'TOKEN': os.getenv('METRICS_TOKEN'),
+    'ALLOWED_IPS': ['127.0.0.1'],
+}
+
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:8001',
     'http://127.0.0.1:8001'
 ]
+# chunked image uploads send & read Upload-Offset
+CORS_ALLOW_HEADERS = (*default_headers, 'upload-offset')
+CORS_EXPOSE_HEADERS = ['Upload-Offset']
 
 ROOT_URLCONF = "storefront.urls"
 
@@ -95,12 +114,33 @@ DATABASES = {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": os.getenv('DB_NAME'),
         "HOST": os.getenv('DB_HOST'),
-        "USERNAME": os.getenv('DB_USER'),
+        "USER": os.getenv('DB_USER'),
         "PASSWORD": os.getenv('DB_PASSWORD'),
         "PORT": os.getenv('DB_PORT')
     }
 }
 
+# catalog GETs can be served by read replicas, see store.replicas
+# DB_REPLICA_HOSTS=replica1.internal,replica2.internal
+STORE_REPLICAS = {
+    'ALIASES': [],
+    # seconds a replica may lag before reads go back to the primary
+    'MAX_LAG': 2,
+    # after a write, the client reads from the primary this long
+    'PIN_SECONDS': 5,
+}
+for i, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    alias = f'replica{i + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        # tests read the replica through the test database
+        'TEST': {'MIRROR': 'default'},
+    }
+    STORE_REPLICAS['ALIASES'].append(alias)
+
+DATABASE_ROUTERS = ['store.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -141,6 +181,23 @@ STATIC_URL = "static/"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# who sends the bytes of media files (see core/media.py):
+# 'python', 'x-accel-redirect' (nginx), 'x-sendfile' (Apache, lighttpd),
+# or None when the proxy serves MEDIA_ROOT without asking Django
+MEDIA_SERVING = {
+    'MODE': 'python',
+    'ACCEL_PREFIX': '/protected-media/',  # nginx `internal` location aliasing MEDIA_ROOT
+    'MAX_AGE': 60 * 60,  # cache lifetime of files whose name isn't a content hash
+}
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # product images, stored once per content (see store/storage.py),
+    # written in OPTIONS['temp_dir'] (default: .cas-tmp next to MEDIA_ROOT) first
+    'images': {'BACKEND': 'store.storage.ContentAddressedStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -160,6 +217,18 @@ REST_FRAMEWORK = {
     # ],
 }
 
+# orjson is optional, same output as DRF's JSON classes only faster
+if find_spec('orjson'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [
+        'core.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ]
+
 AUTH_USER_MODEL = 'core.User'
 
 DJOSER = {
@@ -193,9 +262,66 @@ CELERY_BROKER_URL = 'redis://localhost:6379/1'
 CELERY_BEAT_SCHEDULE = {
     'notify_customers': {
         'task': 'playground.tasks.notify_customers',
-        'schedule': 5, # every 5 seconds
-        # 'schedule': crontab(day_of_week=1, hour=7, minute=30), # every Monday at 7:30
+        # 'schedule': 5, # every 5 seconds
+        'schedule': crontab(day_of_week=1, hour=7, minute=30), # every Monday at 7:30
         # 'schedule': crontab(minute='*/15'), # every 15 minutes
         'args': ['Hello World']
+    },
+    # checkout kicks a drain on commit, this catches the rest
+    'drain_outbox': {
+        'task': 'store.tasks.drain_outbox',
+        'schedule': 30,
+    },
+    'delete_stale_uploads': {
+        'task': 'store.tasks.delete_stale_uploads',
+        'schedule': crontab(minute=0), # every hour
+    },
+    'delete_orphaned_blobs': {
+        'task': 'store.tasks.delete_orphaned_blobs',
+        'schedule': crontab(minute='*/15'),
     }
 }
+
+
+# read-through cache for /store/products/ payloads (see store/cache.py)
+# backends are tried in order; add a SharedCacheBackend to share between workers
+STORE_CACHE = {
+    'BACKENDS': [
+        {
+            'BACKEND': 'store.cache.LocalLRUBackend',
+            'OPTIONS': {'max_entries': 1000, 'timeout': 30},
+        },
+        # {
+        #     'BACKEND': 'store.cache.SharedCacheBackend',
+        #     'OPTIONS': {'alias': 'default', 'timeout': 60 * 15},
+        # },
+    ],
+    # cache alias holding the version counters, must be shared in production
+    # (check store.E001)
+    'VERSIONS': 'default',
+}
+
+# where anonymous carts live (see store/carts.py)
+# RedisCartStore keeps them out of postgres until checkout
+STORE_CARTS = {
+    'BACKEND': 'store.carts.DatabaseCartStore',
+    # 'BACKEND': 'store.carts.RedisCartStore',
+    # 'OPTIONS': {
+    #     'url': 'redis://localhost:6379/2',
+    #     'timeout': 60 * 60 * 24 * 7, # carts expire after a week idle
+    # },
+}
+
+# chunked image uploads (see store/uploads.py), DIR has to be
+# shared by every app server, unfinished uploads are deleted after EXPIRE_AFTER
+STORE_UPLOADS = {
+    'DIR': os.path.join(BASE_DIR, 'uploads'),
+    'CHUNK_SIZE': 1024 * 1024,
+    'EXPIRE_AFTER': 60 * 60 * 24,
+}
+
+# product image files nobody references are deleted after GRACE seconds
+# (see store/blobs.py)
+STORE_BLOBS = {
+    'GRACE': 60 * 10,
+}
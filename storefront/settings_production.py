@@ -0,0 +1,77 @@
+# storefront/settings_production.py
+# DJANGO_SETTINGS_MODULE=storefront.settings_production
+# Same as settings.py minus the development tools, everything
+# deployment specific comes from the environment.
+import os
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE, DATABASES, STORE_CACHE, MEDIA_SERVING, REQUEST_METRICS
+
+
+def env_bool(name, default=False):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+DEBUG = env_bool('DEBUG')
+
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
+
+# the toolbar records every query & template of every request
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [m for m in MIDDLEWARE if not m.startswith('debug_toolbar.')]
+
+# Reuse database connections instead of opening one per request.
+# DB_POOL=true: psycopg pool (needs psycopg-pool), shared by the threads
+#   of a worker process, CONN_MAX_AGE has to stay 0 with it.
+# otherwise: persistent connections, checked before reuse so a
+#   connection dropped by the server or a failover isn't handed out.
+for database in DATABASES.values():  # the primary & any replicas
+    database['CONN_HEALTH_CHECKS'] = True
+    if env_bool('DB_POOL'):
+        # with a pool, health checks make it ping connections before handing them out
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+            }
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+# shared between workers: sessions, throttling and the product
+# cache's version counters all need to agree across processes
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'TIMEOUT': 60 * 10,
+        }
+    }
+    STORE_CACHE = {
+        **STORE_CACHE,
+        'BACKENDS': STORE_CACHE['BACKENDS'] + [{
+            'BACKEND': 'store.cache.SharedCacheBackend',
+            'OPTIONS': {'alias': 'default', 'timeout': 60 * 10},
+        }],
+    }
+
+# scrapers send METRICS_TOKEN as a bearer token, the address check is
+# off unless METRICS_ALLOWED_IPS is set (a local proxy makes it moot)
+REQUEST_METRICS = {
+    **REQUEST_METRICS,
+    'ALLOWED_IPS': [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip],
+}
+
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/1')
+
+# e.g. x-accel-redirect behind nginx, 'off' when nginx serves /media/ itself
+MEDIA_SERVING = {
+    **MEDIA_SERVING,
+    'MODE': os.getenv('MEDIA_SERVING_MODE', 'python'),
+    'ACCEL_PREFIX': os.getenv('MEDIA_ACCEL_PREFIX', MEDIA_SERVING['ACCEL_PREFIX']),
+}
+if MEDIA_SERVING['MODE'] == 'off':
+    MEDIA_SERVING['MODE'] = None
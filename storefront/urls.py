@@ -1,10 +1,10 @@
 # storefront/urls.py
+import re
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from core import media
 # from debug_toolbar.toolbar import debug_toolbar_urls
-import debug_toolbar
 
 
 admin.site.site_header = 'Storefront Admin'
@@ -16,9 +16,17 @@ urlpatterns = [
     path('store/', include('store.urls')),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
-    path('_debug_/', include(debug_toolbar.urls)),
+    path('', include('core.urls')),
 ]
 # ] + debug_toolbar_urls()
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# settings_production drops the toolbar
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    import debug_toolbar
+    urlpatterns += [path('_debug_/', include(debug_toolbar.urls))]
+
+# MEDIA_SERVING['MODE'] is None when the proxy serves MEDIA_ROOT itself
+if settings.MEDIA_SERVING.get('MODE'):
+    urlpatterns += [
+        re_path(rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$', media.serve)
+    ]